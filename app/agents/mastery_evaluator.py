@@ -1,36 +1,42 @@
 import json
 import autogen
+from app.agents.model_router import model_router, SchemaValidationError
 from app.core.config import settings
+from app.core.resilience import remaining_seconds
 
 class MasteryEvaluatorAgent:
-    def __init__(self):
-        self.config_list = [
+    def _build_agents(self, model: str):
+        # autogen agents keep chat history, so every routed call gets its own pair
+        config_list = [
             {
-                'model': 'gpt-3.5-turbo',
+                'model': model,
                 'api_key': settings.OPENAI_API_KEY,
             }
         ]
         
-        self.llm_config = {
-            "config_list": self.config_list,
+        llm_config = {
+            "config_list": config_list,
             "temperature": 0.5,
             "seed": 42,
         }
+        timeout = remaining_seconds()
+        if timeout is not None:
+            llm_config["timeout"] = timeout
 
-        self.assistant = autogen.AssistantAgent(
+        assistant = autogen.AssistantAgent(
             name="assistant",
-            llm_config=self.llm_config,
+            llm_config=llm_config,
             system_message="You are a helpful assistant specialized in evaluating the mastery level of a student in a topic.",
             code_execution_config=False
         )
 
-        self.user_proxy = autogen.UserProxyAgent(
+        user_proxy = autogen.UserProxyAgent(
             name="user_proxy",
             human_input_mode="NEVER",
             max_consecutive_auto_reply=1,
             is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
             code_execution_config={"work_dir": "coding"},
-            llm_config=self.llm_config,
+            llm_config=llm_config,
             system_message="""Execute the following steps:
             1. Evaluate the mastery level of the student in the given topic from the list of subtopics provided and all the subtopics shown to the user
             2. Use your intuition on the subtopics selected and the total subtopics to evaluate the mastery level of the student in the given topic
@@ -38,18 +44,32 @@ class MasteryEvaluatorAgent:
             4. Ensure that the mastery level generated belongs to {"beginner", "intermediate", "advanced"}
             5. End your message with 'TERMINATE'."""
         )
+        return assistant, user_proxy
+
+    def _chat(self, model: str, message: str) -> str:
+        assistant, user_proxy = self._build_agents(model)
+        user_proxy.initiate_chat(assistant, message=message)
+        final_message = user_proxy.chat_messages[assistant][-2]["content"]
+        return final_message.replace("TERMINATE", "").strip()
 
     def evaluate_mastery(self, selected_subtopics, total_subtopics) -> list:
-        self.user_proxy.initiate_chat(
-            self.assistant,
-            message=f"Selected subtopics: {selected_subtopics} \n Total subtopics: {total_subtopics}"
-        )
-        final_message = self.user_proxy.chat_messages[self.assistant][-2]["content"]
-        final_message = final_message.replace("TERMINATE", "").strip()
+        message = f"Selected subtopics: {selected_subtopics} \n Total subtopics: {total_subtopics}"
         levels = ["beginner", "intermediate", "advanced"]
-        for level in levels:
-            if level in final_message:
-                return level
-        return "beginner"
+
+        def parse_level(final_message):
+            for level in levels:
+                if level in final_message:
+                    return level
+            raise ValueError(f"No mastery level in response: {final_message}")
+
+        try:
+            return model_router.route(
+                "mastery_evaluation",
+                message,
+                lambda model: self._chat(model, message),
+                parse_level
+            )
+        except SchemaValidationError:
+            return "beginner"
 
 mastery_evaluator_agent = MasteryEvaluatorAgent()
\ No newline at end of file
@@ -1,36 +1,42 @@
 import json
 import autogen
+from app.agents.model_router import model_router, SchemaValidationError
 from app.core.config import settings
+from app.core.resilience import remaining_seconds
 
 class MasteryMultiEvaluatorAgent:
-    def __init__(self):
-        self.config_list = [
+    def _build_agents(self, model: str):
+        # autogen agents keep chat history, so every routed call gets its own pair
+        config_list = [
             {
-                'model': 'gpt-3.5-turbo',
+                'model': model,
                 'api_key': settings.OPENAI_API_KEY,
             }
         ]
         
-        self.llm_config = {
-            "config_list": self.config_list,
+        llm_config = {
+            "config_list": config_list,
             "temperature": 0.5,
             "seed": 42,
         }
+        timeout = remaining_seconds()
+        if timeout is not None:
+            llm_config["timeout"] = timeout
 
-        self.assistant = autogen.AssistantAgent(
+        assistant = autogen.AssistantAgent(
             name="assistant",
-            llm_config=self.llm_config,
+            llm_config=llm_config,
             system_message="You are a helpful assistant specialized in evaluating the mastery level of a student in various subtopics based on their responses to questions.",
             code_execution_config=False
         )
 
-        self.user_proxy = autogen.UserProxyAgent(
+        user_proxy = autogen.UserProxyAgent(
             name="user_proxy",
             human_input_mode="NEVER",
             max_consecutive_auto_reply=1,
             is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
             code_execution_config={"work_dir": "coding"},
-            llm_config=self.llm_config,
+            llm_config=llm_config,
             system_message="""Execute the following steps:
             1. Analyze the given questions and student responses for each subtopic.
             2. Evaluate the mastery level of the student for each subtopic based on their responses.
@@ -46,6 +52,13 @@ class MasteryMultiEvaluatorAgent:
             6. Check if the json schema is correct or not. If not correct then fix it and then TERMINATE
             6. End your message with 'TERMINATE'."""
         )
+        return assistant, user_proxy
+
+    def _chat(self, model: str, message: str) -> str:
+        assistant, user_proxy = self._build_agents(model)
+        user_proxy.initiate_chat(assistant, message=message)
+        final_message = user_proxy.chat_messages[assistant][-2]["content"]
+        return final_message.replace("TERMINATE", "").strip()
 
     def evaluate_mastery(self, questions_and_responses, topic, summary, current_mastery, resource_id):
         """
@@ -56,18 +69,22 @@ class MasteryMultiEvaluatorAgent:
         :return: A dictionary of subtopics with their evaluated mastery levels and explanations.
         """
         input_message = json.dumps(questions_and_responses, indent=2)
-        self.user_proxy.initiate_chat(
-            self.assistant,
-            message=f"Evaluate and update the student's mastery dict (current mastery {current_mastery}) for {topic}: {summary} based on these questions and responses:\n{input_message}\n"
-        )
-        
-        final_message = self.user_proxy.chat_messages[self.assistant][-2]["content"]
-        final_message = final_message.replace("TERMINATE", "").strip()
-        
-        try:
+        message = f"Evaluate and update the student's mastery dict (current mastery {current_mastery}) for {topic}: {summary} based on these questions and responses:\n{input_message}\n"
+
+        def parse_mastery(final_message):
             mastery_dict = json.loads(final_message)
+            if not isinstance(mastery_dict, dict):
+                raise TypeError("Mastery response is not a JSON object")
             return mastery_dict
-        except json.JSONDecodeError:
+
+        try:
+            return model_router.route(
+                "mastery_update",
+                message,
+                lambda model: self._chat(model, message),
+                parse_mastery
+            )
+        except SchemaValidationError:
             print("Error: Could not parse the assistant's response as JSON.")
 
             return {}
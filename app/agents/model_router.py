@@ -0,0 +1,249 @@
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import openai
+from app.core.config import settings
+from app.core.metrics import metrics, percentile
+from app.core.resilience import resilience, remaining_seconds
+
+# Models for each task, cheapest first. `default` is the model the task used
+# before routing existed; long inputs start there instead of at the cheap end.
+TASK_ROUTES = {
+    "answer_feedback": {"models": ["gpt-3.5-turbo", "gpt-4"], "default": "gpt-4"},
+    "thought": {"models": ["gpt-3.5-turbo", "gpt-4"], "default": "gpt-4"},
+    "summary": {"models": ["gpt-3.5-turbo", "gpt-4o"], "default": "gpt-4o"},
+    "resource_allocation": {"models": ["gpt-3.5-turbo", "gpt-4o"], "default": "gpt-4o"},
+    "subtopics": {"models": ["gpt-3.5-turbo", "gpt-4o"], "default": "gpt-3.5-turbo"},
+    "mastery_evaluation": {"models": ["gpt-3.5-turbo", "gpt-4o"], "default": "gpt-3.5-turbo"},
+    "mastery_update": {"models": ["gpt-3.5-turbo", "gpt-4o"], "default": "gpt-3.5-turbo"},
+}
+
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-3.5-turbo": 16385,
+    "gpt-4": 8192,
+    "gpt-4o": 128000,
+}
+
+# Observations needed before a model's latency/error stats affect routing
+MIN_SAMPLES = 5
+
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens in a prompt, falling back to a chars/4 estimate if the
+    tokenizer cannot be loaded.
+    """
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            print(f"Could not load tokenizer, estimating token counts: {e}")
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return len(text) // 4
+
+
+class SchemaValidationError(Exception):
+    """Raised when every model available to a task returned output that failed validation."""
+
+    def __init__(self, task: str, content: str, error: Exception):
+        super().__init__(f"{task} output failed validation: {error}")
+        self.task = task
+        self.content = content
+        self.error = error
+
+
+class ModelStats:
+    """Recent calls to one model for one task; calls older than `max_age_seconds` no longer count."""
+
+    def __init__(self, window: int, max_age_seconds: float):
+        self._calls = deque(maxlen=window)
+        self.max_age_seconds = max_age_seconds
+        self._lock = threading.Lock()
+
+    def record(self, latency_ms: float, ok: bool):
+        with self._lock:
+            self._calls.append((time.monotonic(), latency_ms, ok))
+
+    def summary(self) -> dict:
+        cutoff = time.monotonic() - self.max_age_seconds
+        with self._lock:
+            calls = [(latency, ok) for at, latency, ok in self._calls if at >= cutoff]
+        latencies = [latency for latency, ok in calls if ok]
+        failures = sum(1 for _, ok in calls if not ok)
+        return {
+            "samples": len(calls),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "error_rate": failures / len(calls) if calls else 0.0,
+        }
+
+
+class ModelRouter:
+    def __init__(self):
+        self.latency_slo_ms = settings.MODEL_ROUTER_LATENCY_SLO_MS
+        self.max_error_rate = settings.MODEL_ROUTER_MAX_ERROR_RATE
+        self.short_input_tokens = settings.MODEL_ROUTER_SHORT_INPUT_TOKENS
+        self.probe_rate = settings.MODEL_ROUTER_PROBE_RATE
+        # Keyed by (task, model): a long multi-turn allocator chat says little about gpt-4o's latency on summaries
+        self.stats: Dict[Tuple[str, str], ModelStats] = {}
+        self._stats_lock = threading.Lock()
+        self.decisions = deque(maxlen=100)
+
+    def _stats(self, task: str, model: str) -> ModelStats:
+        with self._stats_lock:
+            if (task, model) not in self.stats:
+                self.stats[(task, model)] = ModelStats(
+                    settings.MODEL_ROUTER_STATS_WINDOW, settings.MODEL_ROUTER_STATS_MAX_AGE_SECONDS
+                )
+            return self.stats[(task, model)]
+
+    def _fits(self, model: str, input_tokens: int, max_tokens: int) -> bool:
+        return input_tokens + max_tokens <= MODEL_CONTEXT_WINDOWS.get(model, 0)
+
+    def _is_healthy(self, task: str, model: str) -> bool:
+        summary = self._stats(task, model).summary()
+        if summary["samples"] < MIN_SAMPLES:
+            return True
+        return summary["p50_ms"] <= self.latency_slo_ms and summary["error_rate"] <= self.max_error_rate
+
+    def choose_model(self, task: str, input_tokens: int, max_tokens: int = 0) -> Tuple[str, str]:
+        """
+        Pick the model to try first for a task.
+
+        A model that is over the SLO or error budget still gets a small share
+        of traffic (`MODEL_ROUTER_PROBE_RATE`) so its stats can show recovery;
+        stale samples also age out of its window.
+
+        :param task: Key into TASK_ROUTES
+        :param input_tokens: Token count of the prompt
+        :param max_tokens: Completion budget requested from the model
+        :return: A (model, reason) tuple
+        """
+        route = TASK_ROUTES[task]
+        models = route["models"]
+        if input_tokens <= self.short_input_tokens:
+            start, reason = 0, "short input"
+        else:
+            start, reason = models.index(route["default"]), "long input"
+
+        candidates = [m for m in models[start:] if self._fits(m, input_tokens, max_tokens)]
+        if not candidates:
+            candidates = [m for m in models if self._fits(m, input_tokens, max_tokens)] or [models[-1]]
+            reason = "context window"
+
+        available = [m for m in candidates if not resilience.is_open(f"openai:{m}")] or candidates
+        for model in available:
+            if self._is_healthy(task, model):
+                return model, reason
+            if random.random() < self.probe_rate:
+                return model, "probe"
+        # Nothing is healthy, so prefer models within the error budget, then the fastest. A model
+        # whose every recent call failed has no latencies (p50 of 0), so errors must rank first
+        def fallback_rank(model):
+            summary = self._stats(task, model).summary()
+            over_budget = summary["error_rate"] > self.max_error_rate
+            return over_budget, summary["error_rate"] if over_budget else 0.0, summary["p50_ms"]
+
+        return min(available, key=fallback_rank), "all over SLO"
+
+    def _next_model(self, task: str, model: str, input_tokens: int, max_tokens: int) -> Optional[str]:
+        models = TASK_ROUTES[task]["models"]
+        for candidate in models[models.index(model) + 1:]:
+            if self._fits(candidate, input_tokens, max_tokens):
+                return candidate
+        return None
+
+    def route(self, task: str, prompt: str, call: Callable[[str], str], validate: Callable[[str], object], max_tokens: int = 0):
+        """
+        Run a task on the cheapest suitable model, escalating to a stronger one
+        only when the output fails validation.
+
+        :param task: Key into TASK_ROUTES
+        :param prompt: The full prompt text, used for token counting
+        :param call: Function taking a model name and returning the raw completion text
+        :param validate: Function parsing the raw text, raising ValueError/KeyError/TypeError if it is invalid
+        :param max_tokens: Completion budget requested from the model
+        :return: Whatever `validate` returns for the first valid completion
+        """
+        input_tokens = count_tokens(prompt)
+        model, reason = self.choose_model(task, input_tokens, max_tokens)
+        started = time.monotonic()
+        escalations = 0
+
+        while True:
+            call_started = time.monotonic()
+            try:
+                content = resilience.call(
+                    f"openai:{model}",
+                    lambda: call(model),
+                    client_errors=(openai.BadRequestError,)
+                )
+            except Exception:
+                self._stats(task, model).record((time.monotonic() - call_started) * 1000, ok=False)
+                metrics.incr("model_router.errors", task=task, model=model)
+                raise
+            self._stats(task, model).record((time.monotonic() - call_started) * 1000, ok=True)
+
+            try:
+                result = validate(content)
+                break
+            except (ValueError, KeyError, TypeError) as e:
+                next_model = self._next_model(task, model, input_tokens, max_tokens)
+                self._log_decision(task, input_tokens, model, reason, valid=False)
+                if next_model is None:
+                    raise SchemaValidationError(task, content, e) from e
+                metrics.incr("model_router.escalations", task=task, from_model=model, to_model=next_model)
+                model, reason, escalations = next_model, "escalated", escalations + 1
+
+        self._log_decision(task, input_tokens, model, reason, valid=True)
+        metrics.incr("model_router.requests", task=task, model=model)
+        metrics.observe("model_router.latency_ms", (time.monotonic() - started) * 1000, task=task)
+        if escalations:
+            metrics.incr("model_router.escalated_requests", task=task)
+        return result
+
+    def complete(self, task: str, messages: List[Dict[str, str]], validate: Callable[[str], object], max_tokens: int = None):
+        """Route an OpenAI chat completion; see `route`."""
+        def call(model):
+            timeout = remaining_seconds()
+            response = openai.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                timeout=timeout if timeout is not None else openai.NOT_GIVEN
+            )
+            return response.choices[0].message.content.strip()
+
+        prompt = "\n".join(message["content"] for message in messages)
+        return self.route(task, prompt, call, validate, max_tokens=max_tokens or 0)
+
+    def _log_decision(self, task: str, input_tokens: int, model: str, reason: str, valid: bool):
+        decision = {
+            "time": time.time(),
+            "task": task,
+            "input_tokens": input_tokens,
+            "model": model,
+            "reason": reason,
+            "valid": valid,
+        }
+        self.decisions.append(decision)
+        print(f"Model router: task={task} tokens={input_tokens} model={model} reason={reason} valid={valid}")
+
+    def snapshot(self) -> dict:
+        return {
+            "latency_slo_ms": self.latency_slo_ms,
+            "models": {f"{task}:{model}": stats.summary() for (task, model), stats in list(self.stats.items())},
+            "recent_decisions": list(self.decisions),
+        }
+
+
+model_router = ModelRouter()
@@ -1,56 +1,80 @@
 import json
 import autogen
+import numpy as np
+from app.agents.model_router import model_router
 from app.core.config import settings
+from app.core.resilience import remaining_seconds
+from app.core.seen_index import seen_index
 
 class ResourceAllocatorAgent:
-    def __init__(self):
-        self.config_list = [
+    def _build_agents(self, model: str):
+        # autogen agents keep chat history, so every routed call gets its own pair
+        config_list = [
             {
-                'model': 'gpt-4o',
+                'model': model,
                 'api_key': settings.OPENAI_API_KEY,
             }
         ]
         
-        self.llm_config = {
-            "config_list": self.config_list,
+        llm_config = {
+            "config_list": config_list,
             "temperature": 0.5,
             "seed": 42,
         }
+        timeout = remaining_seconds()
+        if timeout is not None:
+            llm_config["timeout"] = timeout
 
-        self.assistant = autogen.AssistantAgent(
+        assistant = autogen.AssistantAgent(
             name="assistant",
-            llm_config=self.llm_config,
+            llm_config=llm_config,
             system_message="You are a helpful assistant specialized in allocating resources to a student.",
             code_execution_config=False
         )
 
-        self.user_proxy = autogen.UserProxyAgent(
+        user_proxy = autogen.UserProxyAgent(
             name="user_proxy",
             human_input_mode="NEVER",
             max_consecutive_auto_reply=1,
             is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
             code_execution_config={"work_dir": "coding"},
-            llm_config=self.llm_config,
+            llm_config=llm_config,
             system_message="""Execute the following steps:
             1. Read all the resources and then find the one that would be the most relevant for the user
             2. Return the url, title and id of the resource in the json format if you find something that is relevant (find the resource which is closely related)
             3. End your message with 'TERMINATE'."""
         )
+        return assistant, user_proxy
+
+    def _chat(self, model: str, message: str) -> str:
+        assistant, user_proxy = self._build_agents(model)
+        user_proxy.initiate_chat(assistant, message=message)
+        final_message = user_proxy.chat_messages[assistant][-2]["content"]
+        return final_message.replace("TERMINATE", "").replace("```json", "").replace("```", "").strip()
 
     def allocate_resource(self, resources: str, skill_level: str, topic: str, user: str) -> list:
-        filtered_resources = []
-        for resource in resources:
-            if user not in resource["users"]:
-                filtered_resources.append(resource)
-        self.user_proxy.initiate_chat(
-            self.assistant,
-            message=f"Find the most relevant resource from the list of resources: {filtered_resources} for skill level: {skill_level} and topic: {topic}"
+        unseen = seen_index.unseen_mask(user, seen_index.ordinals(resource["id"] for resource in resources))
+        # The viewer list is only needed for the exclusion above, so keep it out of the prompt
+        filtered_resources = [
+            {key: value for key, value in resources[i].items() if key != "users"}
+            for i in np.flatnonzero(unseen)
+        ]
+        message = f"Find the most relevant resource from the list of resources: {filtered_resources} for skill level: {skill_level} and topic: {topic}"
+
+        def parse_resource(final_message):
+            if "None" in final_message:
+                return None
+            resource = json.loads(final_message)
+            missing = [field for field in ("url", "title", "id") if field not in resource]
+            if missing:
+                raise KeyError(f"Resource response is missing {missing}")
+            return resource
+
+        return model_router.route(
+            "resource_allocation",
+            message,
+            lambda model: self._chat(model, message),
+            parse_resource
         )
-        final_message = self.user_proxy.chat_messages[self.assistant][-2]["content"]
-        final_message = final_message.replace("TERMINATE", "").replace("```json", "").replace("```", "").strip()
-        if "None" in final_message:
-            return None
-        else:
-            return json.loads(final_message)
 
 resource_allocator_agent = ResourceAllocatorAgent()
\ No newline at end of file
@@ -1,51 +1,70 @@
 import json
 import autogen
+from app.agents.model_router import model_router
 from app.core.config import settings
+from app.core.resilience import remaining_seconds
 
 class SubtopicsGeneratorAgent:
-    def __init__(self):
-        self.config_list = [
+    def _build_agents(self, model: str):
+        # autogen agents keep chat history, so every routed call gets its own pair
+        config_list = [
             {
-                'model': 'gpt-3.5-turbo',
+                'model': model,
                 'api_key': settings.OPENAI_API_KEY,
             }
         ]
         
-        self.llm_config = {
-            "config_list": self.config_list,
+        llm_config = {
+            "config_list": config_list,
             "temperature": 0.5,
             "seed": 42,
         }
+        timeout = remaining_seconds()
+        if timeout is not None:
+            llm_config["timeout"] = timeout
 
-        self.assistant = autogen.AssistantAgent(
+        assistant = autogen.AssistantAgent(
             name="assistant",
-            llm_config=self.llm_config,
+            llm_config=llm_config,
             system_message="You are a helpful assistant specialized in breaking down topics into subtopics.",
             code_execution_config=False
         )
 
-        self.user_proxy = autogen.UserProxyAgent(
+        user_proxy = autogen.UserProxyAgent(
             name="user_proxy",
             human_input_mode="NEVER",
             max_consecutive_auto_reply=1,
             is_termination_msg=lambda x: x.get("content", "").rstrip().endswith("TERMINATE"),
             code_execution_config={"work_dir": "coding"},
-            llm_config=self.llm_config,
+            llm_config=llm_config,
             system_message="""Execute the following steps:
             1. Generate a list of upto 10 subtopics for the given main topic with each subtopic having a level attached to it (beginner/intermediate/advanced).
             2. Reflect on the generated subtopics and refine them if necessary.
             3. Provide a final, refined list of subtopics in JSON format like this: [{"subtopic": "subtopic1", "level": "beginner"}, {"subtopic": "subtopic2", "level": "intermediate"}, {"subtopic": "subtopic3", "level": "advanced"}]
             4. End your message with 'TERMINATE'."""
         )
+        return assistant, user_proxy
+
+    def _chat(self, model: str, message: str) -> str:
+        assistant, user_proxy = self._build_agents(model)
+        user_proxy.initiate_chat(assistant, message=message)
+        final_message = user_proxy.chat_messages[assistant][-2]["content"]
+        return final_message.replace("TERMINATE", "").strip()
 
     def generate_subtopics(self, main_topic) -> list:
-        self.user_proxy.initiate_chat(
-            self.assistant,
-            message=f"Generate subtopics for the main topic: {main_topic}"
+        message = f"Generate subtopics for the main topic: {main_topic}"
+
+        def parse_subtopics(final_message):
+            subtopics = json.loads(final_message)
+            if not isinstance(subtopics, list):
+                raise TypeError("Subtopics response is not a JSON list")
+            return subtopics
+
+        return model_router.route(
+            "subtopics",
+            message,
+            lambda model: self._chat(model, message),
+            parse_subtopics
         )
-        final_message = self.user_proxy.chat_messages[self.assistant][-2]["content"]
-        final_message = final_message.replace("TERMINATE", "").strip()
-        final_message = json.loads(final_message)
-        return final_message
 
 subtopics_generator_agent = SubtopicsGeneratorAgent()
\ No newline at end of file
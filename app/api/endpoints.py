@@ -3,50 +3,126 @@ from app.agents.subtopics_generator import subtopics_generator_agent
 from app.agents.mastery_evaluator import mastery_evaluator_agent
 from app.agents.resource_allocator import resource_allocator_agent
 from app.agents.mastery_updater import mastery_multi_evaluator_agent
-from fastapi import APIRouter, HTTPException
+from app.agents.model_router import model_router, SchemaValidationError
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Response
+from starlette.concurrency import run_in_threadpool
 from app.db.fauna_client import fauna_client
 from pydantic import BaseModel
 from typing import List
 from youtube_transcript_api import YouTubeTranscriptApi
+from youtube_transcript_api._errors import (
+    TranscriptsDisabled,
+    NoTranscriptFound,
+    NoTranscriptAvailable,
+    VideoUnavailable,
+    InvalidVideoId,
+)
 from faunadb import query as q
 from faunadb.errors import FaunaError
 import re
 import openai
 from pydantic import BaseModel
-from typing import List, Optional,Dict
-from app.api.fauna_utils import query_topic_data, store_topic_data
+from typing import Any, List, Optional,Dict
+from app.api.fauna_utils import canonical_topic, query_topic_data, store_topic_data
+from app.core.config import settings
+from app.core.idempotency import fingerprint, idempotency_store
+from app.core.metrics import metrics
+from app.core.progress import compute_etag, etag_matches, progress_cache
+from app.core.recommendations import recommendation_store
+from app.core.resilience import deadline, resilience, UpstreamUnavailable
+from app.core.seen_index import seen_index
+from app.core.topics import topic_canonicalizer
 
 
 
-def fetch_mastery_level(user: str, topic: str):
+def fetch_mastery_level(user: str, topic_id: str):
     """
     Fetch a user's mastery level for a topic.
     
     :param user: User identifier
-    :param topic: Topic name
+    :param topic_id: Canonical topic ID
     :return: The mastery levels dictionary if found, None otherwise
     """
     try:
         result = fauna_client.query(
-            q.get(q.match(q.index("user_topic_mastery_by_user_and_topic"), user, topic))
+            q.get(q.match(q.index("user_topic_mastery_by_user_and_topic_id"), user, topic_id))
         )
         return result["data"]["mastery_levels"]
     except FaunaError as e:
         if "instance not found" in str(e):
-            print(f"No mastery level found for user '{user}' and topic '{topic}'")
+            print(f"No mastery level found for user '{user}' and topic '{topic_id}'")
         else:
             print(f"An error occurred while fetching the mastery level: {e}")
         return {}
 
+def fetch_user_mastery_documents(user: str):
+    """
+    Fetch all of a user's mastery documents through the
+    `user_topic_mastery_by_user` index (terms: data.user), a page at a time.
+
+    :param user: User identifier
+    :return: List of documents (with ref, ts and data), or None if the query failed
+    """
+    documents = []
+    cursor = None
+    try:
+        while True:
+            page = fauna_client.query(
+                q.map_(
+                    lambda x: q.get(x),
+                    q.paginate(
+                        q.match(q.index("user_topic_mastery_by_user"), user),
+                        size=settings.PROGRESS_PAGE_SIZE,
+                        after=cursor
+                    )
+                )
+            )
+            documents.extend(page["data"])
+            cursor = page.get("after")
+            if cursor is None:
+                return documents
+    except FaunaError as e:
+        print(f"An error occurred while fetching mastery documents for user '{user}': {e}")
+        return None
+
+def fetch_user_mastery_versions(user: str):
+    """
+    Fetch the (document id, ts) pair of each of a user's mastery documents
+    from the `user_topic_mastery_versions_by_user` index (terms: data.user,
+    values: ts, ref), without reading the documents themselves.
+
+    :param user: User identifier
+    :return: List of (document id, ts) pairs, or None if the query failed
+    """
+    versions = []
+    cursor = None
+    try:
+        while True:
+            page = fauna_client.query(
+                q.paginate(
+                    q.match(q.index("user_topic_mastery_versions_by_user"), user),
+                    size=settings.PROGRESS_PAGE_SIZE,
+                    after=cursor
+                )
+            )
+            versions.extend((ref.id(), ts) for ts, ref in page["data"])
+            cursor = page.get("after")
+            if cursor is None:
+                return versions
+    except FaunaError as e:
+        print(f"An error occurred while fetching mastery versions for user '{user}': {e}")
+        return None
+
 from faunadb import query as q
 from faunadb.errors import FaunaError
 
-def update_or_create_mastery_level(user: str, topic: str, updated_mastery_levels: dict):
+def update_or_create_mastery_level(user: str, topic_id: str, topic: str, updated_mastery_levels: dict):
     """
     Update a user's mastery level for a topic or create a new entry if it doesn't exist.
     
     :param user: User identifier
-    :param topic: Topic name
+    :param topic_id: Canonical topic ID
+    :param topic: Topic name as the user wrote it, stored on a new entry
     :param updated_mastery_levels: Updated dictionary of subtopics and their mastery levels
     :return: True if update/creation was successful, False otherwise
     """
@@ -54,7 +130,7 @@ def update_or_create_mastery_level(user: str, topic: str, updated_mastery_levels
         result = fauna_client.query(
             q.let(
                 {
-                    "match": q.match(q.index("user_topic_mastery_by_user_and_topic"), user, topic)
+                    "match": q.match(q.index("user_topic_mastery_by_user_and_topic_id"), user, topic_id)
                 },
                 q.if_(
                     q.exists(q.var("match")),
@@ -70,6 +146,7 @@ def update_or_create_mastery_level(user: str, topic: str, updated_mastery_levels
                             "data": {
                                 "user": user,
                                 "topic": topic,
+                                "topic_id": topic_id,
                                 "mastery_levels": updated_mastery_levels
                             }
                         }
@@ -77,7 +154,9 @@ def update_or_create_mastery_level(user: str, topic: str, updated_mastery_levels
                 )
             )
         )
-        print(f"Mastery level for user '{user}' and topic '{topic}' updated or created successfully.")
+        print(f"Mastery level for user '{user}' and topic '{topic_id}' updated or created successfully.")
+        topic_canonicalizer.register(topic_id)
+        progress_cache.invalidate(user)
         return True
     except FaunaError as e:
         print(f"An error occurred while updating or creating the mastery level: {e}")
@@ -146,10 +225,55 @@ def fetch_all_resources():
             }
             for doc in results["data"]
         ]
+        seen_index.sync(resources)
         return resources
     except FaunaError as e:
         return None
 
+def fetch_recommendation_state(user: str, topic_id: str, resource_id: Optional[str] = None):
+    """
+    Read, in one query, the shared state a stored recommendation depends on,
+    so any worker can tell whether it is still valid.
+
+    The mastery version is the `ts` of the user's mastery document for the
+    topic. The catalog version is the resource count plus the newest resource
+    ID, which changes on any add or delete; edits to an existing resource only
+    show up once a stored recommendation expires.
+
+    :param user: User identifier
+    :param topic_id: Canonical topic ID
+    :param resource_id: Resource whose viewers to read, if any
+    :return: Dict with mastery_version, catalog_version and viewers (None if the
+             resource no longer exists), or None if the query failed
+    """
+    resources = q.documents(q.collection(RESOURCES_COLLECTION))
+    resource_ref = q.ref(q.collection(RESOURCES_COLLECTION), resource_id) if resource_id else None
+    try:
+        state = fauna_client.query(
+            q.let(
+                {"mastery": q.match(q.index("user_topic_mastery_by_user_and_topic_id"), user, topic_id)},
+                {
+                    "mastery_version": q.if_(q.exists(q.var("mastery")), q.select(["ts"], q.get(q.var("mastery"))), 0),
+                    "resource_count": q.count(resources),
+                    "newest_resource": q.select(["data", 0], q.paginate(q.reverse(resources), size=1), None),
+                    "viewers": q.if_(
+                        q.exists(resource_ref),
+                        q.select(["data", "users"], q.get(resource_ref), []),
+                        None
+                    ) if resource_ref is not None else None,
+                }
+            )
+        )
+    except FaunaError as e:
+        print(f"An error occurred while reading recommendation state: {e}")
+        return None
+    newest = state["newest_resource"]
+    return {
+        "mastery_version": state["mastery_version"],
+        "catalog_version": (state["resource_count"], newest.id() if newest is not None else None),
+        "viewers": state["viewers"],
+    }
+
 def update_resource_user(resource_id, user):
     # Fetch the resource document directly using its ID
     resource = fauna_client.query(
@@ -159,26 +283,28 @@ def update_resource_user(resource_id, user):
     # Get the current users or initialize an empty list
     users = resource["data"].get("users", [])
     
-    # Append the new user
-    users.append(user)
-    
-    # Update the document
-    fauna_client.query(
-        q.update(
-            q.ref(q.collection(RESOURCES_COLLECTION), resource_id),
-            {"data": {"users": users}}
+    # Append the new user, unless a retried completion already did
+    if user not in users:
+        users.append(user)
+        
+        # Update the document
+        fauna_client.query(
+            q.update(
+                q.ref(q.collection(RESOURCES_COLLECTION), resource_id),
+                {"data": {"users": users}}
+            )
         )
-    )
+    seen_index.mark_seen(user, resource_id)
 
 
 @router.post("/get_subtopics", response_model=SubtopicsResponse)
 async def get_subtopics(request: TopicRequest):
     user = request.user
-    topic = request.topic
-    subtopics = query_topic_data(user, topic)
+    topic_id = await run_in_threadpool(canonical_topic, request.topic)
+    subtopics = query_topic_data(user, topic_id)
     if subtopics is None:
-        subtopics = subtopics_generator_agent.generate_subtopics(topic)
-        store_topic_data(user, topic, subtopics)
+        subtopics = subtopics_generator_agent.generate_subtopics(request.topic)
+        store_topic_data(user, request.topic, topic_id, subtopics)
     return SubtopicsResponse(subtopics=subtopics)
 
 def extract_video_id(url: str) -> str:
@@ -193,30 +319,47 @@ def extract_video_id(url: str) -> str:
             return match.group(1)
     raise ValueError("Invalid YouTube URL")
 
+# Transcript errors that say something about the video rather than the health of YouTube
+TRANSCRIPT_CLIENT_ERRORS = (
+    TranscriptsDisabled,
+    NoTranscriptFound,
+    NoTranscriptAvailable,
+    VideoUnavailable,
+    InvalidVideoId,
+)
+
 def get_transcript(video_id: str) -> str:
     try:
-        transcript = YouTubeTranscriptApi.get_transcript(video_id)
+        transcript = resilience.call(
+            "youtube",
+            lambda: YouTubeTranscriptApi.get_transcript(video_id),
+            client_errors=TRANSCRIPT_CLIENT_ERRORS
+        )
         return " ".join([entry['text'] for entry in transcript])
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=e.status_code, detail=f"Failed to fetch transcript: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to fetch transcript: {str(e)}")
 
+def parse_summary_and_questions(content: str) -> dict:
+    result = json.loads(content)
+    if not isinstance(result, dict) or not isinstance(result.get("summary"), str) or not isinstance(result.get("questions"), list):
+        raise ValueError("Expected a 'summary' string and a 'questions' list")
+    return result
+
 def generate_summary_and_questions(transcript: str) -> dict:
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a helpful assistant that summarizes video transcripts and generates questions based on the content."},
-                {"role": "user", "content": f"Based on the following transcript, provide a brief summary of the video content and generate 5 questions to test the viewer's understanding. Format your response as JSON with 'summary' and 'questions' fields. Give a JSON that I can directly use with no trailing or leading characters. Do not have any backticks or the word json in the beginning or end.\n\n{transcript}"}
-            ],
-            max_tokens=500
-        )
-        result = response.choices[0].message.content.strip()
-        
+        messages = [
+            {"role": "system", "content": "You are a helpful assistant that summarizes video transcripts and generates questions based on the content."},
+            {"role": "user", "content": f"Based on the following transcript, provide a brief summary of the video content and generate 5 questions to test the viewer's understanding. Format your response as JSON with 'summary' and 'questions' fields. Give a JSON that I can directly use with no trailing or leading characters. Do not have any backticks or the word json in the beginning or end.\n\n{transcript}"}
+        ]
         try:
-            return json.loads(result)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, use the backup formatter
-            return backup_json_formatter(result)
+            return model_router.complete("summary", messages, parse_summary_and_questions, max_tokens=500)
+        except SchemaValidationError as e:
+            # If JSON parsing fails on every model, use the backup formatter
+            return backup_json_formatter(e.content)
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate summary and questions: {str(e)}")
 
@@ -232,42 +375,42 @@ async def get_youtube_summary_and_questions(request: YouTubeQuestionRequest):
     except ValueError as ve:
         raise HTTPException(status_code=400, detail=str(ve))
 
-async def get_mastery_level(user, topic, selected_subtopics):
-    generated_subtopics = query_topic_data(user, topic)
+def get_mastery_level(user, topic_id, selected_subtopics):
+    generated_subtopics = query_topic_data(user, topic_id)
     mastery_level = mastery_evaluator_agent.evaluate_mastery(selected_subtopics, generated_subtopics)
     return mastery_level
 
 
+def parse_feedback(content: str) -> FeedbackResponse:
+    gpt_response = json.loads(content)
+    if not isinstance(gpt_response, dict):
+        raise TypeError("Feedback response is not a JSON object")
+
+    if isinstance(gpt_response.get('improvement_suggestions'), str):
+        gpt_response['improvement_suggestions'] = [gpt_response['improvement_suggestions']]
+    elif 'improvement_suggestions' not in gpt_response:
+        gpt_response['improvement_suggestions'] = []
+
+    return FeedbackResponse(
+        is_correct=gpt_response['is_correct'],
+        explanation=gpt_response['explanation'],
+        improvement_suggestions=gpt_response['improvement_suggestions']
+    )
+
 @router.post("/get_answer_feedback", response_model=FeedbackResponse)
 async def get_answer_feedback(request: FeedbackRequest):
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an educational assistant that provides feedback on answers to questions. Provide your response in JSON format with 'is_correct', 'explanation', and 'improvement_suggestions' fields. The 'improvement_suggestions' should always be a list of strings, even if it's empty."},
-                {"role": "user", "content": f"Question: {request.question}\nAnswer: {request.answer}\n\nEvaluate if this answer is correct. Provide an explanation and suggestions for improvement if needed. Respond in JSON format."}
-            ],
-            max_tokens=300
-        )
-        
-        gpt_response = json.loads(response.choices[0].message.content.strip())
-
-        if isinstance(gpt_response.get('improvement_suggestions'), str):
-            gpt_response['improvement_suggestions'] = [gpt_response['improvement_suggestions']]
-        elif 'improvement_suggestions' not in gpt_response:
-            gpt_response['improvement_suggestions'] = []
-        
-        feedback = FeedbackResponse(
-            is_correct=gpt_response['is_correct'],
-            explanation=gpt_response['explanation'],
-            improvement_suggestions=gpt_response['improvement_suggestions']
-        )
-        
-        return feedback
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Failed to parse GPT response: {str(e)}")
-    except KeyError as e:
-        raise HTTPException(status_code=500, detail=f"Missing required field in GPT response: {str(e)}")
+        messages = [
+            {"role": "system", "content": "You are an educational assistant that provides feedback on answers to questions. Provide your response in JSON format with 'is_correct', 'explanation', and 'improvement_suggestions' fields. The 'improvement_suggestions' should always be a list of strings, even if it's empty."},
+            {"role": "user", "content": f"Question: {request.question}\nAnswer: {request.answer}\n\nEvaluate if this answer is correct. Provide an explanation and suggestions for improvement if needed. Respond in JSON format."}
+        ]
+        return model_router.complete("answer_feedback", messages, parse_feedback, max_tokens=300)
+    except SchemaValidationError as e:
+        if isinstance(e.error, KeyError):
+            raise HTTPException(status_code=500, detail=f"Missing required field in GPT response: {str(e.error)}")
+        raise HTTPException(status_code=500, detail=f"Failed to parse GPT response: {str(e.error)}")
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate feedback: {str(e)}")
 
@@ -287,14 +430,14 @@ def backup_feedback_formatter(original_response: str) -> dict:
         The 'improvement_suggestions' field should always be a list of strings, even if it's empty.
         """
 
-        response = openai.chat.completions.create(
+        response = resilience.call("openai:gpt-4", lambda: openai.chat.completions.create(
             model="gpt-4",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that corrects JSON formatting for educational feedback."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=500
-        )
+        ))
         
         corrected_json = json.loads(response.choices[0].message.content.strip())
         return corrected_json
@@ -311,34 +454,80 @@ def backup_json_formatter(original_response: str) -> dict:
         Please correct any formatting issues and return a valid JSON object with 'summary' and 'questions' fields. The 'questions' field should be a list of strings.
         """
 
-        response = openai.chat.completions.create(
+        response = resilience.call("openai:gpt-4o", lambda: openai.chat.completions.create(
             model="gpt-4o",
             messages=[
                 {"role": "system", "content": "You are a helpful assistant that corrects JSON formatting."},
                 {"role": "user", "content": prompt}
             ],
             max_tokens=500
-        )
+        ))
         
         corrected_json = json.loads(response.choices[0].message.content.strip())
         return corrected_json
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         return backup_json_formatter(original_response)
         raise HTTPException(status_code=500, detail=f"Failed to correct JSON formatting: {str(e)}")
 
 
-@router.post("/get_resource", response_model=ResourceResponse)
-async def get_resource(request: TopicRequest):
-    user = request.user
-    topic = request.topic
-    selected_subtopics = request.subtopics
-    mastery_level = await get_mastery_level(user, topic, selected_subtopics)
-    resources = fetch_all_resources()
-    resource = resource_allocator_agent.allocate_resource(resources, mastery_level, topic, user)
+def precompute_recommendation(user: str, topic_id: str, topic: str):
+    """
+    Background job run after a mastery update: compute the resource the next
+    /get_resource would return and store it for (user, topic_id).
+    """
+    selected_subtopics = recommendation_store.last_subtopics(user, topic_id)
+    if selected_subtopics is None:
+        metrics.incr("precompute.jobs", outcome="no_subtopics")
+        return
+    try:
+        with deadline(settings.PRECOMPUTE_DEADLINE_SECONDS, inherit=False):
+            # Read before computing, so a write that lands meanwhile invalidates the result
+            state = fetch_recommendation_state(user, topic_id)
+            if state is None:
+                metrics.incr("precompute.jobs", outcome="failed")
+                return
+            mastery_level = get_mastery_level(user, topic_id, selected_subtopics)
+            resources = fetch_all_resources()
+            resource = resource_allocator_agent.allocate_resource(resources, mastery_level, topic, user)
+        if resource is None:
+            metrics.incr("precompute.jobs", outcome="no_resource")
+            return
+        recommendation_store.put(
+            user, topic_id, selected_subtopics, resource, state["mastery_version"], state["catalog_version"]
+        )
+        metrics.incr("precompute.jobs", outcome="stored")
+    except Exception as e:
+        print(f"Failed to precompute recommendation for user '{user}' and topic '{topic_id}': {e}")
+        metrics.incr("precompute.jobs", outcome="failed")
+
+def allocate_next_resource(user: str, topic_id: str, topic: str, selected_subtopics: list) -> ResourceResponse:
+    recommendation_store.remember_subtopics(user, topic_id, selected_subtopics)
+    resource = recommendation_store.get(
+        user, topic_id, selected_subtopics,
+        lambda resource_id: fetch_recommendation_state(user, topic_id, resource_id)
+    )
+    if resource is None:
+        mastery_level = get_mastery_level(user, topic_id, selected_subtopics)
+        resources = fetch_all_resources()
+        resource = resource_allocator_agent.allocate_resource(resources, mastery_level, topic, user)
     return ResourceResponse(url=resource['url'], title=resource['title'], id=resource['id'])
 
-@router.post("/update_mastery_level", response_model=MasteryLevelResponse)
-async def update_mastery_level(request: UpdateMasteryLevelRequest):
+@router.post("/get_resource", response_model=ResourceResponse)
+async def get_resource(request: TopicRequest, response: Response, idempotency_key: Optional[str] = Header(None)):
+    topic_id = await run_in_threadpool(canonical_topic, request.topic)
+    result, replayed = await idempotency_store.run(
+        "/get_resource",
+        idempotency_key,
+        fingerprint(request.model_dump_json()),
+        lambda: run_in_threadpool(allocate_next_resource, request.user, topic_id, request.topic, request.subtopics)
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+def apply_mastery_update(request: UpdateMasteryLevelRequest, topic_id: str):
     user = request.user
     topic = request.topic
     questions = request.questions
@@ -347,12 +536,33 @@ async def update_mastery_level(request: UpdateMasteryLevelRequest):
     resource_id = request.resource_id
     questions = [{"question": question, "answer": answer} for question, answer in zip(questions, answers)]
     update_resource_user(resource_id, user)
-    current_mastery = fetch_mastery_level(user, topic)
+    current_mastery = fetch_mastery_level(user, topic_id)
     mastery_level = mastery_multi_evaluator_agent.evaluate_mastery(questions, topic, summary, current_mastery, resource_id)
     current_mastery.update(mastery_level)
-    update_or_create_mastery_level(user, topic, current_mastery)
+    update_or_create_mastery_level(user, topic_id, topic, current_mastery)
+    recommendation_store.invalidate(user, topic_id)
     return MasteryLevelResponse(mastery_level=current_mastery)
 
+@router.post("/update_mastery_level", response_model=MasteryLevelResponse)
+async def update_mastery_level(
+    request: UpdateMasteryLevelRequest,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None)
+):
+    topic_id = await run_in_threadpool(canonical_topic, request.topic)
+    result, replayed = await idempotency_store.run(
+        "/update_mastery_level",
+        idempotency_key,
+        fingerprint(request.model_dump_json()),
+        lambda: run_in_threadpool(apply_mastery_update, request, topic_id)
+    )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    else:
+        background_tasks.add_task(precompute_recommendation, request.user, topic_id, request.topic)
+    return result
+
 class MasteryLevelRequest(BaseModel):
     user: str
     topic: str
@@ -362,9 +572,11 @@ class MasteryLevelMarkdownResponse(BaseModel):
     markdown: str
 
 def generate_markdown(topic: str, mastery_levels: Dict[str, str]) -> str:
-    markdown = f"# Mastery Levels for {topic}\n\n"
-    markdown += "| Subtopic | Mastery Level |\n"
-    markdown += "|----------|---------------|\n"
+    lines = [
+        f"# Mastery Levels for {topic}\n",
+        "| Subtopic | Mastery Level |",
+        "|----------|---------------|",
+    ]
     
     for subtopic, level in mastery_levels.items():
         emoji = {
@@ -373,9 +585,9 @@ def generate_markdown(topic: str, mastery_levels: Dict[str, str]) -> str:
             "ADVANCED": "🚀",
         }.get(level.upper(), "🌱")
         
-        markdown += f"| {subtopic} | {emoji} {level.capitalize()} |\n"
+        lines.append(f"| {subtopic} | {emoji} {level.capitalize()} |")
     
-    return markdown
+    return "\n".join(lines) + "\n"
 
 @router.post("/get_mastery_level_markdown", response_model=MasteryLevelMarkdownResponse)
 async def get_mastery_level_markdown(request: MasteryLevelRequest):
@@ -385,6 +597,71 @@ async def get_mastery_level_markdown(request: MasteryLevelRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate markdown: {str(e)}")
     
+class TopicProgress(BaseModel):
+    topic: str
+    mastery_levels: Dict[str, Any]
+    updated_at: int
+
+class ProgressReportResponse(BaseModel):
+    user: str
+    topics: List[TopicProgress]
+    markdown: str
+
+def level_name(value) -> str:
+    # The mastery updater stores {"level": ..., "explanation": ...} per subtopic
+    if isinstance(value, dict):
+        return str(value.get("level", ""))
+    return str(value)
+
+def display_topic(doc: dict) -> str:
+    return doc["data"].get("topic") or doc["data"].get("topic_id", "")
+
+def build_progress_report(user: str, documents: list) -> ProgressReportResponse:
+    # Headings use the topic as the user wrote it, not its canonical ID
+    documents = sorted(documents, key=lambda doc: display_topic(doc).casefold())
+    topics = [
+        TopicProgress(
+            topic=display_topic(doc),
+            mastery_levels=doc["data"].get("mastery_levels", {}),
+            updated_at=doc["ts"]
+        )
+        for doc in documents
+    ]
+    markdown = "\n".join(
+        generate_markdown(
+            topic.topic,
+            {subtopic: level_name(value) for subtopic, value in topic.mastery_levels.items()}
+        )
+        for topic in topics
+    )
+    return ProgressReportResponse(user=user, topics=topics, markdown=markdown)
+
+@router.get("/progress/{user}", response_model=ProgressReportResponse)
+async def get_progress(user: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    # The ETag comes from the shared index on every request, so a write made on another
+    # worker is seen here even though this worker's cache was never invalidated
+    versions = await run_in_threadpool(fetch_user_mastery_versions, user)
+    if versions is None:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch progress for user '{user}'")
+    etag = compute_etag(versions)
+    if etag_matches(if_none_match, etag):
+        metrics.incr("progress.not_modified")
+        return Response(status_code=304, headers={"ETag": etag})
+
+    cached = progress_cache.get(user, etag)
+    if cached is None:
+        generation = progress_cache.generation(user)
+        documents = await run_in_threadpool(fetch_user_mastery_documents, user)
+        if documents is None:
+            raise HTTPException(status_code=500, detail=f"Failed to fetch progress for user '{user}'")
+        etag = compute_etag((doc["ref"].id(), doc["ts"]) for doc in documents)
+        report = build_progress_report(user, documents)
+        progress_cache.put(user, generation, etag, report)
+    else:
+        report = cached
+    response.headers["ETag"] = etag
+    return report
+
 class FakeThoughtsRequest(BaseModel):
     user: str
     topic: str
@@ -419,22 +696,23 @@ async def thoughts(request: FakeThoughtsRequest):
         Structure it like its an ongoing thought chain ending with , based on this let me find the right resource for you. Keep overall thing within 3-4 sentences .
         """
 
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are an insightful tutor providing feedback on a student's performance."},
-                {"role": "user", "content": prompt}
-            ],
+        messages = [
+            {"role": "system", "content": "You are an insightful tutor providing feedback on a student's performance."},
+            {"role": "user", "content": prompt}
+        ]
+        return model_router.complete(
+            "thought",
+            messages,
+            lambda content: FakeThoughtsResponse(thoughts=json.loads(content)['thoughts']),
             max_tokens=300
         )
-        
-        result = json.loads(response.choices[0].message.content.strip())
-        return FakeThoughtsResponse(thoughts=result['thoughts'])
     
-    except json.JSONDecodeError as e:
-        raise HTTPException(status_code=500, detail=f"Failed to parse GPT response: {str(e)}")
-    except KeyError as e:
-        raise HTTPException(status_code=500, detail=f"Missing required field in GPT response: {str(e)}")
+    except SchemaValidationError as e:
+        if isinstance(e.error, KeyError):
+            raise HTTPException(status_code=500, detail=f"Missing required field in GPT response: {str(e.error)}")
+        raise HTTPException(status_code=500, detail=f"Failed to parse GPT response: {str(e.error)}")
+    except UpstreamUnavailable as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate fake thoughts: {str(e)}")
 
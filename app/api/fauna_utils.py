@@ -1,13 +1,15 @@
 from faunadb import query as q
 from faunadb.errors import FaunaError
 from app.db.fauna_client import fauna_client
+from app.core.topics import normalize_topic, topic_canonicalizer
 
-def store_topic_data(user_id: str, topic: str, sub_topics: list, selected_subtopics: list=None):
+def store_topic_data(user_id: str, topic: str, topic_id: str, sub_topics: list, selected_subtopics: list=None):
     """
     Store topic data for a user in Fauna.
     
     :param user_id: The ID of the user
-    :param topic: The main topic
+    :param topic: The main topic, as the user wrote it
+    :param topic_id: The canonical ID of the main topic, used for lookups
     :param sub_topics: List of all subtopics
     :param selected_subtopics: List of subtopics selected by the user
     :return: The ID of the created document
@@ -20,6 +22,7 @@ def store_topic_data(user_id: str, topic: str, sub_topics: list, selected_subtop
                     "data": {
                         "userId": user_id,
                         "topic": topic,
+                        "topicId": topic_id,
                         "subTopics": sub_topics,
                         "selectedSubtopics": selected_subtopics if selected_subtopics else []
                     }
@@ -27,18 +30,19 @@ def store_topic_data(user_id: str, topic: str, sub_topics: list, selected_subtop
             )
         )
         print(f"Document stored successfully with ID: {result['ref'].id()}")
+        topic_canonicalizer.register(topic_id)
         return result['ref'].id()
     except FaunaError as e:
         print(f"An error occurred while storing the document: {e}")
         return None
 
-def query_topic_data(user_id: str, topic: str):
+def query_topic_data(user_id: str, topic_id: str):
     try:
         result = fauna_client.query(
             q.map_(
                 lambda x: q.get(x),
                 q.paginate(
-                    q.match(q.index("user_topics_by_user_and_topic"), user_id, topic)
+                    q.match(q.index("user_topics_by_user_and_topic_id"), user_id, topic_id)
                 )
             )
         )
@@ -48,4 +52,118 @@ def query_topic_data(user_id: str, topic: str):
     except FaunaError as e:
         print(f"An error occurred while querying the documents: {e}")
         return None
-    
\ No newline at end of file
+    
+# Collection name -> field holding the canonical topic ID
+TOPIC_COLLECTIONS = {"mastery": "topicId", "user_topic_mastery": "topic_id"}
+FETCH_PAGE_SIZE = 1000
+
+def fetch_collection_documents(collection: str):
+    """Fetch every document in a collection, a page at a time."""
+    documents = []
+    cursor = None
+    while True:
+        page = fauna_client.query(
+            q.map_(
+                lambda x: q.get(x),
+                q.paginate(q.documents(q.collection(collection)), size=FETCH_PAGE_SIZE, after=cursor)
+            )
+        )
+        documents.extend(page["data"])
+        cursor = page.get("after")
+        if cursor is None:
+            return documents
+
+def stored_topic_id(collection: str, doc: dict) -> str:
+    """The canonical topic ID of a stored document, derived from its topic if it predates topic IDs."""
+    return doc["data"].get(TOPIC_COLLECTIONS[collection]) or normalize_topic(doc["data"]["topic"])
+
+def fetch_all_topics():
+    """
+    Fetch the canonical topic ID of every stored topic and mastery document.
+
+    :return: List of topic IDs, or None if they couldn't be fetched
+    """
+    try:
+        return [
+            stored_topic_id(collection, doc)
+            for collection in TOPIC_COLLECTIONS
+            for doc in fetch_collection_documents(collection)
+            if "topic" in doc["data"]
+        ]
+    except Exception as e:
+        # Includes connection errors; topic IDs don't depend on this, only misspelling matches do
+        print(f"An error occurred while fetching topics: {e}")
+        return None
+
+def load_canonical_topics():
+    """Index the stored topics in the background; a failed load is retried by later calls."""
+    topic_canonicalizer.load_in_background(fetch_all_topics)
+
+def canonical_topic(topic: str) -> str:
+    """Map a topic from a request onto its canonical ID, the key documents are stored under."""
+    load_canonical_topics()
+    return topic_canonicalizer.canonicalize(topic)
+
+def backfill_canonical_topics(dry_run: bool = False) -> dict:
+    """
+    Give stored documents a canonical topic ID, keeping their topic text.
+
+    `user_topic_mastery` documents with the same user and topic ID are merged
+    into the most recently updated one (its levels win on conflicts) and the
+    others are deleted. Topics that read as misspellings of, or only look
+    like, another stored topic are listed for review and left apart.
+
+    :param dry_run: Only count what would change
+    :return: Counts of documents given an ID, merged and deleted, and of topics to review
+    """
+    counts = {"updated": 0, "merged": 0, "deleted": 0, "to_review": 0}
+    mastery_documents = fetch_collection_documents("mastery")
+    user_topic_documents = fetch_collection_documents("user_topic_mastery")
+    topic_ids = sorted(
+        {stored_topic_id("mastery", doc) for doc in mastery_documents}
+        | {stored_topic_id("user_topic_mastery", doc) for doc in user_topic_documents}
+    )
+    topic_canonicalizer.load(lambda: topic_ids)
+
+    for doc in mastery_documents:
+        topic_id = stored_topic_id("mastery", doc)
+        if doc["data"].get("topicId") != topic_id:
+            counts["updated"] += 1
+            if not dry_run:
+                fauna_client.query(q.update(doc["ref"], {"data": {"topicId": topic_id}}))
+
+    groups = {}
+    for doc in user_topic_documents:
+        key = (doc["data"]["user"], stored_topic_id("user_topic_mastery", doc))
+        groups.setdefault(key, []).append(doc)
+
+    for (user, topic_id), docs in groups.items():
+        docs.sort(key=lambda doc: doc["ts"])
+        keeper = docs[-1]
+        mastery_levels = {}
+        for doc in docs:
+            mastery_levels.update(doc["data"].get("mastery_levels", {}))
+        if len(docs) == 1 and keeper["data"].get("topic_id") == topic_id:
+            continue
+        counts["updated"] += 1
+        counts["merged"] += len(docs) > 1
+        counts["deleted"] += len(docs) - 1
+        if dry_run:
+            continue
+        fauna_client.query(
+            q.do(
+                q.update(keeper["ref"], {"data": {"topic_id": topic_id, "mastery_levels": mastery_levels}}),
+                *[q.delete(doc["ref"]) for doc in docs[:-1]]
+            )
+        )
+
+    for topic_id in topic_ids:
+        misspelling_of, looks_like = topic_canonicalizer.review(topic_id)
+        if misspelling_of is not None:
+            print(f"Review: '{topic_id}' reads as a misspelling of '{misspelling_of}'")
+        elif looks_like is not None:
+            print(f"Review: '{topic_id}' looks like '{looks_like}'")
+        counts["to_review"] += misspelling_of is not None or looks_like is not None
+
+    print(f"Canonical topic backfill{' (dry run)' if dry_run else ''}: {counts}")
+    return counts
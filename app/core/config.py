@@ -8,6 +8,48 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     ALLOWED_HOSTS: str = "*"
 
+    # Model routing
+    MODEL_ROUTER_LATENCY_SLO_MS: float = 8000
+    MODEL_ROUTER_MAX_ERROR_RATE: float = 0.2
+    MODEL_ROUTER_SHORT_INPUT_TOKENS: int = 1500
+    MODEL_ROUTER_STATS_WINDOW: int = 200
+    MODEL_ROUTER_STATS_MAX_AGE_SECONDS: float = 300
+    MODEL_ROUTER_PROBE_RATE: float = 0.05
+
+    # Upstream resilience (OpenAI, YouTube transcripts)
+    REQUEST_DEADLINE_SECONDS: float = 60
+    HEDGE_PERCENTILE: float = 95
+    HEDGE_INITIAL_DELAY_MS: float = 5000
+    HEDGE_MIN_DELAY_MS: float = 200
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_BREAKER_RESET_SECONDS: float = 30
+    CIRCUIT_BREAKER_HALF_OPEN_PROBES: int = 1
+    RESILIENCE_MAX_WORKERS: int = 32
+
+    # Precomputed recommendations
+    PRECOMPUTE_TTL_SECONDS: float = 900
+    PRECOMPUTE_MAX_ENTRIES: int = 10000
+    PRECOMPUTE_DEADLINE_SECONDS: float = 120
+
+    # Idempotency-Key replay (shared between workers through Fauna)
+    IDEMPOTENCY_TTL_SECONDS: float = 600
+    IDEMPOTENCY_MAX_ENTRIES: int = 5000
+    IDEMPOTENCY_CLAIM_TTL_SECONDS: float = 120
+    IDEMPOTENCY_POLL_INTERVAL_SECONDS: float = 0.5
+
+    # Topic canonicalization (Dice similarity over character trigrams finds candidates)
+    TOPIC_MATCH_THRESHOLD: float = 0.8
+    TOPIC_CANDIDATE_THRESHOLD: float = 0.4
+    TOPIC_INDEX_MAX_ENTRIES: int = 50000
+    TOPIC_MAX_SUGGESTIONS: int = 200
+    TOPIC_LOOKUP_CACHE_ENTRIES: int = 1000
+    TOPIC_LOAD_RETRY_SECONDS: float = 60
+
+    # /progress reports
+    PROGRESS_PAGE_SIZE: int = 100
+    PROGRESS_CACHE_TTL_SECONDS: float = 300
+    PROGRESS_CACHE_MAX_ENTRIES: int = 1000
+
     class Config:
         env_file = ".env"
 
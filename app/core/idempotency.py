@@ -0,0 +1,260 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from faunadb import query as q
+from faunadb.errors import BadRequest
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import metrics
+from app.core.resilience import remaining_seconds
+from app.db.fauna_client import fauna_client
+
+IDEMPOTENCY_COLLECTION = "idempotency_keys"
+IDEMPOTENCY_INDEX = "idempotency_keys_by_key"
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an Idempotency-Key is reused with a different request body."""
+    status_code = 422
+
+
+class IdempotencyInProgress(Exception):
+    """Raised when the original request for an Idempotency-Key is still running elsewhere past the deadline."""
+    status_code = 409
+
+
+def fingerprint(body: str) -> str:
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class FaunaIdempotencyRecords:
+    """
+    Idempotency records shared by every worker, one document per key in the
+    `idempotency_keys` collection. The `idempotency_keys_by_key` index
+    (terms: data.key, unique) makes claiming a key atomic; see
+    scripts/create_fauna_indexes.py.
+
+    A claim lives for IDEMPOTENCY_CLAIM_TTL_SECONDS so a crashed worker can't
+    block a key for long; a completed response for IDEMPOTENCY_TTL_SECONDS.
+    """
+
+    def claim(self, key: str, request_fingerprint: str) -> Optional[dict]:
+        """
+        Claim `key` for this request.
+
+        :return: None if this request now owns the key, otherwise the existing record's data
+        """
+        try:
+            return fauna_client.query(
+                q.let(
+                    {"match": q.match(q.index(IDEMPOTENCY_INDEX), key)},
+                    q.if_(
+                        q.exists(q.var("match")),
+                        q.select(["data"], q.get(q.var("match"))),
+                        q.do(
+                            q.create(
+                                q.collection(IDEMPOTENCY_COLLECTION),
+                                {
+                                    "data": {"key": key, "fingerprint": request_fingerprint, "state": "in_flight"},
+                                    "ttl": q.time_add(q.now(), settings.IDEMPOTENCY_CLAIM_TTL_SECONDS, "seconds"),
+                                }
+                            ),
+                            None
+                        )
+                    )
+                )
+            )
+        except BadRequest as e:
+            # Another worker created the record between our check and create
+            if "not unique" not in str(e):
+                raise
+            return self.get(key) or {"fingerprint": request_fingerprint, "state": "in_flight"}
+
+    def get(self, key: str) -> Optional[dict]:
+        return fauna_client.query(
+            q.let(
+                {"match": q.match(q.index(IDEMPOTENCY_INDEX), key)},
+                q.if_(q.exists(q.var("match")), q.select(["data"], q.get(q.var("match"))), None)
+            )
+        )
+
+    def complete(self, key: str, response: object):
+        fauna_client.query(
+            q.update(
+                q.select(["ref"], q.get(q.match(q.index(IDEMPOTENCY_INDEX), key))),
+                {
+                    "data": {"state": "completed", "response": response},
+                    "ttl": q.time_add(q.now(), settings.IDEMPOTENCY_TTL_SECONDS, "seconds"),
+                }
+            )
+        )
+
+    def release(self, key: str):
+        fauna_client.query(
+            q.let(
+                {"match": q.match(q.index(IDEMPOTENCY_INDEX), key)},
+                q.if_(q.exists(q.var("match")), q.delete(q.select(["ref"], q.get(q.var("match")))), None)
+            )
+        )
+
+
+class IdempotencyStore:
+    """
+    Completed responses and in-flight requests keyed by Idempotency-Key.
+
+    A retry of a finished request gets the stored response back. A retry
+    that arrives while the original is still running waits for it instead of
+    starting a second run. Keys are shared between workers through `records`;
+    each worker also keeps recent responses and its own in-flight requests in
+    memory, so a retry on the same worker needs no round trip. Completed local
+    entries expire after `ttl_seconds` and the oldest are evicted beyond
+    `max_entries`.
+
+    If the shared records can't be read, requests run as if they had no key
+    on other workers, i.e. the per-worker guarantees still hold.
+    """
+
+    def __init__(
+        self,
+        ttl_seconds: float = settings.IDEMPOTENCY_TTL_SECONDS,
+        max_entries: int = settings.IDEMPOTENCY_MAX_ENTRIES,
+        records=None,
+        poll_interval_seconds: float = settings.IDEMPOTENCY_POLL_INTERVAL_SECONDS,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.records = records
+        self.poll_interval_seconds = poll_interval_seconds
+        self._completed: "OrderedDict[str, Tuple[str, object, float]]" = OrderedDict()
+        self._in_flight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._completed:
+            _, _, expires_at = next(iter(self._completed.values()))
+            if expires_at > now and len(self._completed) <= self.max_entries:
+                break
+            self._completed.popitem(last=False)
+            metrics.incr("idempotency.evicted")
+        metrics.set_gauge("idempotency.entries", len(self._completed))
+
+    async def _records_call(self, method: str, *args):
+        try:
+            return await run_in_threadpool(getattr(self.records, method), *args)
+        except Exception as e:
+            print(f"Idempotency records unavailable for {method}: {e}")
+            metrics.incr("idempotency.records_errors", operation=method)
+            raise
+
+    async def _run_shared(self, scope: str, store_key: str, request_fingerprint: str, handler: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        if self.records is None:
+            return await handler(), False
+
+        while True:
+            try:
+                existing = await self._records_call("claim", store_key, request_fingerprint)
+            except Exception:
+                return await handler(), False
+
+            if existing is None:
+                try:
+                    response = await handler()
+                except BaseException:
+                    # Let a retry run the request again
+                    try:
+                        await self._records_call("release", store_key)
+                    except Exception:
+                        pass
+                    raise
+                try:
+                    await self._records_call("complete", store_key, jsonable_encoder(response))
+                except Exception:
+                    pass
+                return response, False
+
+            if existing["fingerprint"] != request_fingerprint:
+                metrics.incr("idempotency.conflicts", scope=scope)
+                raise IdempotencyConflict(f"Idempotency-Key {store_key.split(':', 1)[1]} was already used for a different request")
+            if existing["state"] == "completed":
+                metrics.incr("idempotency.replayed", scope=scope, source="shared")
+                return existing["response"], True
+
+            # The original is running on another worker: wait for its response
+            metrics.incr("idempotency.joined_in_flight", scope=scope, source="shared")
+            while True:
+                remaining = remaining_seconds()
+                if remaining is not None and remaining <= self.poll_interval_seconds:
+                    raise IdempotencyInProgress(f"The request for Idempotency-Key {store_key.split(':', 1)[1]} is still in progress")
+                await asyncio.sleep(self.poll_interval_seconds)
+                try:
+                    existing = await self._records_call("get", store_key)
+                except Exception:
+                    continue
+                if existing is None:
+                    # The original failed and released the key, so claim it again
+                    break
+                if existing["state"] == "completed":
+                    return existing["response"], True
+
+    async def run(self, scope: str, key: Optional[str], request_fingerprint: str, handler: Callable[[], Awaitable]) -> Tuple[object, bool]:
+        """
+        Run `handler` at most once per (scope, key).
+
+        :param scope: Namespace for the key, normally the endpoint path
+        :param key: The client's Idempotency-Key header, or None to always run the handler
+        :param request_fingerprint: Hash of the request body, to detect a key reused for a different request
+        :param handler: Coroutine function producing the response
+        :return: A (response, replayed) tuple; a response replayed from another worker is its JSON form
+        """
+        if key is None:
+            return await handler(), False
+
+        store_key = f"{scope}:{key}"
+        self._evict()
+
+        completed = self._completed.get(store_key)
+        if completed is not None:
+            stored_fingerprint, response, _ = completed
+            if stored_fingerprint != request_fingerprint:
+                metrics.incr("idempotency.conflicts", scope=scope)
+                raise IdempotencyConflict(f"Idempotency-Key {key} was already used for a different request")
+            metrics.incr("idempotency.replayed", scope=scope, source="local")
+            return response, True
+
+        in_flight = self._in_flight.get(store_key)
+        if in_flight is not None:
+            stored_fingerprint, future = in_flight
+            if stored_fingerprint != request_fingerprint:
+                metrics.incr("idempotency.conflicts", scope=scope)
+                raise IdempotencyConflict(f"Idempotency-Key {key} is in use by a different request")
+            metrics.incr("idempotency.joined_in_flight", scope=scope, source="local")
+            response, _ = await asyncio.shield(future)
+            return response, True
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[store_key] = (request_fingerprint, future)
+        try:
+            response, replayed = await self._run_shared(scope, store_key, request_fingerprint, handler)
+        except BaseException as e:
+            # Failures aren't stored, so a later retry runs again; current waiters see the error
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()
+            raise
+        finally:
+            self._in_flight.pop(store_key, None)
+
+        self._completed[store_key] = (request_fingerprint, response, time.monotonic() + self.ttl_seconds)
+        self._evict()
+        future.set_result((response, replayed))
+        return response, replayed
+
+
+idempotency_store = IdempotencyStore(records=FaunaIdempotencyRecords())
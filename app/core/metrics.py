@@ -0,0 +1,72 @@
+import threading
+from collections import defaultdict, deque
+from typing import Dict
+
+
+def _key(name: str, labels: dict) -> str:
+    if not labels:
+        return name
+    label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{label_str}}}"
+
+
+def percentile(values, pct: float) -> float:
+    """
+    Nearest-rank percentile of a sequence of numbers.
+
+    :param values: Observed values (need not be sorted)
+    :param pct: Percentile in the range 0-100
+    :return: The percentile value, or 0.0 if there are no values
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Metrics:
+    """In-process counters and sample windows, exported as a JSON snapshot on /metrics."""
+
+    def __init__(self, window: int = 1000):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = defaultdict(float)
+        self._gauges: Dict[str, float] = {}
+        self._samples: Dict[str, deque] = {}
+
+    def incr(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            self._counters[_key(name, labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[_key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            if key not in self._samples:
+                self._samples[key] = deque(maxlen=self.window)
+            self._samples[key].append(value)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            samples = {key: list(values) for key, values in self._samples.items()}
+            snapshot = {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+            }
+        snapshot["summaries"] = {
+            key: {
+                "count": len(values),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+            }
+            for key, values in samples.items()
+        }
+        return snapshot
+
+
+metrics = Metrics()
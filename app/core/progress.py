@@ -0,0 +1,79 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+def compute_etag(versions: Iterable[Tuple[str, int]]) -> str:
+    """
+    Strong ETag over (document id, Fauna ts) pairs, so it changes whenever
+    any document is written, added or removed.
+    """
+    digest = hashlib.sha256()
+    for document_id, ts in sorted(versions):
+        digest.update(f"{document_id}:{ts};".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == etag for candidate in candidates)
+
+
+class ProgressReportCache:
+    """
+    Rendered progress reports per user, served only while they match the
+    user's current ETag and dropped on mastery writes and after a TTL.
+
+    Each user has a generation bumped by every invalidation, so a report
+    fetched while a mastery write landed is not stored over the newer data.
+    """
+
+    def __init__(self, ttl_seconds: float = settings.PROGRESS_CACHE_TTL_SECONDS, max_entries: int = settings.PROGRESS_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, object, float]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user: str, etag: str) -> Optional[object]:
+        """Return the cached report for a user if it was built for `etag`, the user's current version."""
+        with self._lock:
+            entry = self._entries.get(user)
+            if entry is None or entry[0] != etag or time.monotonic() - entry[2] > self.ttl_seconds:
+                self._entries.pop(user, None)
+                metrics.incr("progress.cache_misses")
+                return None
+            self._entries.move_to_end(user)
+            metrics.incr("progress.cache_hits")
+            return entry[1]
+
+    def generation(self, user: str) -> int:
+        """Read before fetching a report and pass to `put`."""
+        with self._lock:
+            return self._generations.get(user, 0)
+
+    def put(self, user: str, generation: int, etag: str, report: object):
+        with self._lock:
+            if self._generations.get(user, 0) != generation:
+                # Mastery was written while this report was being built
+                metrics.incr("progress.discarded")
+                return
+            self._entries[user] = (etag, report, time.monotonic())
+            self._entries.move_to_end(user)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user: str):
+        with self._lock:
+            self._entries.pop(user, None)
+            self._generations[user] = self._generations.get(user, 0) + 1
+
+
+progress_cache = ProgressReportCache()
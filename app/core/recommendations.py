@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+
+def _subtopics_key(subtopics: Optional[List[dict]]) -> str:
+    return json.dumps(subtopics, sort_keys=True)
+
+
+class RecommendationStore:
+    """
+    Next-resource recommendations precomputed after a mastery update, keyed by
+    (user, topic).
+
+    Entries live in one worker, but whether one may be served is checked
+    against shared state read from storage on the hit path: the (user, topic)
+    mastery version and the catalog version it was computed against must still
+    be current and the user must not have completed the resource since, on any
+    worker. The request must also ask about the same subtopics, and the entry
+    must be younger than the TTL.
+    """
+
+    def __init__(self, ttl_seconds: float = settings.PRECOMPUTE_TTL_SECONDS, max_entries: int = settings.PRECOMPUTE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], dict]" = OrderedDict()
+        self._last_subtopics: "OrderedDict[Tuple[str, str], List[dict]]" = OrderedDict()
+        self._hits = 0
+        self._lookups = 0
+        self._lock = threading.Lock()
+
+    def _remember(self, table: OrderedDict, key, value):
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.max_entries:
+            table.popitem(last=False)
+
+    def remember_subtopics(self, user: str, topic: str, subtopics: Optional[List[dict]]):
+        """Keep the subtopics from the latest /get_resource so the next one can be precomputed."""
+        with self._lock:
+            self._remember(self._last_subtopics, (user, topic), subtopics)
+
+    def last_subtopics(self, user: str, topic: str) -> Optional[List[dict]]:
+        with self._lock:
+            return self._last_subtopics.get((user, topic))
+
+    def invalidate(self, user: str, topic: str):
+        """Drop the stored recommendation after a mastery write on this worker."""
+        with self._lock:
+            self._entries.pop((user, topic), None)
+
+    def put(self, user: str, topic: str, subtopics: Optional[List[dict]], resource: dict, mastery_version: int, catalog_version):
+        with self._lock:
+            self._remember(self._entries, (user, topic), {
+                "resource": resource,
+                "subtopics_key": _subtopics_key(subtopics),
+                "mastery_version": mastery_version,
+                "catalog_version": catalog_version,
+                "created_at": time.time(),
+            })
+
+    def _validate(self, user: str, entry: Optional[dict], subtopics: Optional[List[dict]], fetch_state: Callable[[str], Optional[dict]]) -> Optional[str]:
+        """Return why `entry` can't be served, or None if it can."""
+        if entry is None:
+            return "absent"
+        if entry["subtopics_key"] != _subtopics_key(subtopics):
+            return "subtopics_changed"
+        if time.time() - entry["created_at"] > self.ttl_seconds:
+            return "expired"
+        state = fetch_state(entry["resource"]["id"])
+        if state is None:
+            return "state_unavailable"
+        if state["mastery_version"] != entry["mastery_version"]:
+            return "mastery_changed"
+        if state["catalog_version"] != entry["catalog_version"]:
+            return "catalog_changed"
+        if state["viewers"] is None:
+            return "resource_removed"
+        if user in state["viewers"]:
+            return "already_seen"
+        return None
+
+    def get(self, user: str, topic: str, subtopics: Optional[List[dict]], fetch_state: Callable[[str], Optional[dict]]) -> Optional[dict]:
+        """
+        Return the stored recommendation if it is still valid, recording hit/miss metrics.
+
+        :param fetch_state: Function taking a resource ID and reading the shared state the entry
+                            depends on (see `fetch_recommendation_state`), or returning None if it
+                            can't be read; only called when there is an entry to check
+        """
+        key = (user, topic)
+        with self._lock:
+            entry = self._entries.get(key)
+        reason = self._validate(user, entry, subtopics, fetch_state)
+
+        with self._lock:
+            self._lookups += 1
+            if reason is not None:
+                if entry is not None and self._entries.get(key) is entry:
+                    self._entries.pop(key)
+                metrics.incr("precompute.misses", reason=reason)
+            else:
+                self._hits += 1
+                metrics.incr("precompute.hits")
+                metrics.observe("precompute.served_age_seconds", time.time() - entry["created_at"])
+            metrics.set_gauge("precompute.hit_rate", self._hits / self._lookups)
+        return entry["resource"] if reason is None else None
+
+
+recommendation_store = RecommendationStore()
@@ -0,0 +1,271 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics, percentile
+
+# Absolute time.monotonic() by which the current request must finish
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+class UpstreamUnavailable(Exception):
+    status_code = 503
+
+
+class CircuitOpenError(UpstreamUnavailable):
+    status_code = 503
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    status_code = 504
+
+
+@contextmanager
+def deadline(seconds: float, inherit: bool = True):
+    """
+    Bound everything called inside the block to `seconds` from now. Nested
+    deadlines can only shorten the one already in effect, unless `inherit`
+    is False (for background work that outlives the request that queued it).
+    """
+    new_deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None and inherit:
+        new_deadline = min(new_deadline, current)
+    token = _deadline.set(new_deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_seconds() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is no deadline."""
+    current = _deadline.get()
+    if current is None:
+        return None
+    return max(0.0, current - time.monotonic())
+
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int, reset_seconds: float, half_open_probes: int):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = half_open_probes
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self.state = self.HALF_OPEN
+            self._probes_in_flight = 0
+
+    def is_open(self) -> bool:
+        """Whether `allow()` would currently refuse a call."""
+        with self._lock:
+            self._refresh()
+            if self.state == self.HALF_OPEN:
+                return self._probes_in_flight >= self.half_open_probes
+            return self.state == self.OPEN
+
+    def allow(self) -> bool:
+        """Return True if a call may go through, reserving a probe slot when half-open."""
+        with self._lock:
+            self._refresh()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def release(self):
+        """Give back a probe slot taken by `allow()` for a call that ended without an outcome."""
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._probes_in_flight > 0:
+                self._probes_in_flight -= 1
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"Circuit for {self.name} closed")
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"Circuit for {self.name} opened after {self._failures} failures")
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class Resilience:
+    """
+    Runs upstream calls with a deadline, a per-upstream circuit breaker and a
+    hedged duplicate sent once the call outlives that upstream's observed p95.
+    """
+
+    def __init__(
+        self,
+        hedge_percentile: float = settings.HEDGE_PERCENTILE,
+        hedge_initial_delay_ms: float = settings.HEDGE_INITIAL_DELAY_MS,
+        hedge_min_delay_ms: float = settings.HEDGE_MIN_DELAY_MS,
+        failure_threshold: int = settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = settings.CIRCUIT_BREAKER_RESET_SECONDS,
+        half_open_probes: int = settings.CIRCUIT_BREAKER_HALF_OPEN_PROBES,
+        max_workers: int = settings.RESILIENCE_MAX_WORKERS,
+    ):
+        self.hedge_percentile = hedge_percentile
+        self.hedge_initial_delay_ms = hedge_initial_delay_ms
+        self.hedge_min_delay_ms = hedge_min_delay_ms
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_probes = half_open_probes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upstream")
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latencies: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def breaker(self, upstream: str) -> CircuitBreaker:
+        with self._lock:
+            if upstream not in self.breakers:
+                self.breakers[upstream] = CircuitBreaker(
+                    upstream, self.failure_threshold, self.reset_seconds, self.half_open_probes
+                )
+                self.latencies[upstream] = deque(maxlen=500)
+            return self.breakers[upstream]
+
+    def is_open(self, upstream: str) -> bool:
+        return self.breaker(upstream).is_open()
+
+    def expected_latency(self, upstream: str) -> float:
+        """Seconds `upstream` normally takes: its observed p95, or the initial hedge delay until there is enough history."""
+        samples = list(self.latencies.get(upstream, ()))
+        if len(samples) < 20:
+            return self.hedge_initial_delay_ms / 1000
+        return percentile(samples, self.hedge_percentile) / 1000
+
+    def hedge_delay(self, upstream: str) -> float:
+        """Seconds to wait for the primary call before sending a hedged duplicate."""
+        return max(self.hedge_min_delay_ms / 1000, self.expected_latency(upstream))
+
+    def _submit(self, fn: Callable, started_at: Dict[Future, List[float]]) -> Future:
+        # Each attempt runs in its own copy of the caller's context so the deadline follows it,
+        # and notes when a worker actually picked it up, since it may queue behind abandoned losers
+        run_started = []
+
+        def attempt():
+            run_started.append(time.monotonic())
+            return fn()
+
+        future = self.executor.submit(contextvars.copy_context().run, attempt)
+        started_at[future] = run_started
+        return future
+
+    def call(self, upstream: str, fn: Callable, hedge: bool = True, client_errors: Tuple[type, ...] = ()):
+        """
+        Call `fn` against `upstream`, returning the first successful result.
+
+        :param upstream: Name of the upstream, used for its breaker and latency history
+        :param fn: Zero-argument callable doing the upstream request
+        :param hedge: Whether a duplicate may be sent when the first attempt is slow
+        :param client_errors: Exceptions caused by the request itself; re-raised without counting against the breaker
+        :return: The return value of `fn`
+        """
+        timeout = remaining_seconds()
+        if timeout is not None and timeout <= 0:
+            raise DeadlineExceeded(f"Deadline exceeded before calling {upstream}")
+
+        breaker = self.breaker(upstream)
+        if not breaker.allow():
+            metrics.incr("resilience.rejected", upstream=upstream)
+            raise CircuitOpenError(f"{upstream} is unavailable (circuit open)")
+        # A half-open breaker only lets single probes through
+        hedge = hedge and breaker.state == CircuitBreaker.CLOSED
+
+        try:
+            return self._call(upstream, breaker, fn, hedge, timeout, client_errors)
+        finally:
+            # No-op once the call recorded an outcome; otherwise frees a half-open probe slot
+            breaker.release()
+
+    def _call(self, upstream: str, breaker: CircuitBreaker, fn: Callable, hedge: bool, timeout: Optional[float], client_errors: Tuple[type, ...]):
+        started = time.monotonic()
+        hedge_at = started + self.hedge_delay(upstream) if hedge else None
+        deadline_at = started + timeout if timeout is not None else None
+        started_at: Dict[Future, List[float]] = {}
+        pending = {self._submit(fn, started_at)}
+        last_error = None
+
+        while pending:
+            now = time.monotonic()
+            wake_times = [t for t in (hedge_at, deadline_at) if t is not None]
+            wait_for = max(0.0, min(wake_times) - now) if wake_times else None
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    # Losers already running can't be interrupted; their own
+                    # upstream timeout (set from the deadline) bounds them
+                    for loser in pending:
+                        loser.cancel()
+                    latency_ms = (time.monotonic() - started_at[future][0]) * 1000
+                    self.latencies[upstream].append(latency_ms)
+                    metrics.observe("resilience.latency_ms", latency_ms, upstream=upstream)
+                    breaker.record_success()
+                    return future.result()
+                last_error = error
+                if hedge_at is not None and not isinstance(error, client_errors):
+                    # The hedge doubles as a single retry when the first attempt fails fast
+                    hedge_at = time.monotonic()
+
+            now = time.monotonic()
+            if deadline_at is not None and now >= deadline_at:
+                for future in pending:
+                    future.cancel()
+                # Only blame the upstream for time it actually had: a deadline shorter than its
+                # usual latency, or one spent queued for a worker, is the caller's doing
+                run_starts = [run_started[0] for run_started in started_at.values() if run_started]
+                ran_for = now - min(run_starts) if run_starts else 0.0
+                if ran_for >= self.expected_latency(upstream):
+                    breaker.record_failure()
+                    metrics.incr("resilience.deadline_exceeded", upstream=upstream, blamed="upstream")
+                else:
+                    metrics.incr("resilience.deadline_exceeded", upstream=upstream, blamed="deadline")
+                raise DeadlineExceeded(f"{upstream} did not respond within the request deadline")
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                pending.add(self._submit(fn, started_at))
+                metrics.incr("resilience.hedges", upstream=upstream)
+
+        if isinstance(last_error, client_errors):
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+            metrics.incr("resilience.failures", upstream=upstream)
+        raise last_error
+
+    def snapshot(self) -> dict:
+        return {
+            upstream: {"state": breaker.state, "hedge_delay_ms": self.hedge_delay(upstream) * 1000}
+            for upstream, breaker in list(self.breakers.items())
+        }
+
+
+resilience = Resilience()
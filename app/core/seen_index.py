@@ -0,0 +1,138 @@
+import bisect
+import threading
+from array import array
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from app.core.metrics import metrics
+
+
+class SeenSet:
+    """
+    One user's seen resources as a compressed bitmap over resource ordinals.
+
+    Starts as a sorted array of ordinals (4 bytes per seen resource) and
+    switches to a plain bitset (1 bit per catalog resource) once that is
+    smaller, so memory stays bounded by the catalog size either way.
+    """
+
+    __slots__ = ("_ordinals", "_bits")
+
+    def __init__(self):
+        self._ordinals = array("I")
+        self._bits = None
+
+    def add(self, ordinal: int, catalog_size: int):
+        if self._bits is not None:
+            byte = ordinal >> 3
+            if byte >= len(self._bits):
+                self._bits.extend(bytes(byte - len(self._bits) + 1))
+            self._bits[byte] |= 1 << (ordinal & 7)
+            return
+
+        position = bisect.bisect_left(self._ordinals, ordinal)
+        if position < len(self._ordinals) and self._ordinals[position] == ordinal:
+            return
+        self._ordinals.insert(position, ordinal)
+        if len(self._ordinals) * 32 > catalog_size:
+            self._to_bitset(catalog_size)
+
+    def _to_bitset(self, catalog_size: int):
+        bits = np.zeros((catalog_size + 7) // 8 * 8, dtype=np.uint8)
+        bits[np.frombuffer(self._ordinals, dtype=np.uint32)] = 1
+        self._bits = bytearray(np.packbits(bits, bitorder="little").tobytes())
+        self._ordinals = array("I")
+
+    def contains(self, ordinals: np.ndarray) -> np.ndarray:
+        """Vectorized membership test for an array of ordinals."""
+        if self._bits is None:
+            if not self._ordinals:
+                return np.zeros(len(ordinals), dtype=bool)
+            return np.isin(ordinals, np.frombuffer(self._ordinals, dtype=np.uint32))
+        bits = np.frombuffer(self._bits, dtype=np.uint8)
+        seen = np.zeros(len(ordinals), dtype=bool)
+        inside = ordinals < len(bits) * 8
+        in_range = ordinals[inside]
+        seen[inside] = (bits[in_range >> 3] >> (in_range & 7).astype(np.uint8)) & 1
+        return seen
+
+    def nbytes(self) -> int:
+        if self._bits is None:
+            return self._ordinals.itemsize * len(self._ordinals)
+        return len(self._bits)
+
+
+class SeenIndex:
+    """
+    Per-user index of resources already shown, built from the `users` arrays
+    on resource documents.
+
+    Resources get dense ordinals in the order they are first seen. `sync`
+    only replays the part of each `users` array that has been appended since
+    the last sync, so keeping the index current costs O(resources + new views)
+    rather than O(resources x viewers).
+    """
+
+    def __init__(self):
+        self._ordinals: Dict[str, int] = {}
+        self._synced_viewers: List[int] = []
+        self._users: Dict[str, SeenSet] = {}
+        self._lock = threading.Lock()
+
+    def _ordinal(self, resource_id: str) -> int:
+        ordinal = self._ordinals.get(resource_id)
+        if ordinal is None:
+            ordinal = len(self._ordinals)
+            self._ordinals[resource_id] = ordinal
+            self._synced_viewers.append(0)
+        return ordinal
+
+    def _add(self, user: str, ordinal: int):
+        seen = self._users.get(user)
+        if seen is None:
+            seen = self._users[user] = SeenSet()
+        seen.add(ordinal, len(self._ordinals))
+
+    def sync(self, resources: List[dict]):
+        """
+        Bring the index up to date with a freshly fetched catalog.
+
+        :param resources: Resource dicts as returned by fetch_all_resources
+        """
+        with self._lock:
+            for resource in resources:
+                ordinal = self._ordinal(resource["id"])
+                users = resource["users"]
+                synced = self._synced_viewers[ordinal]
+                if len(users) > synced:
+                    for user in users[synced:]:
+                        self._add(user, ordinal)
+                    self._synced_viewers[ordinal] = len(users)
+            metrics.set_gauge("seen_index.resources", len(self._ordinals))
+            metrics.set_gauge("seen_index.users", len(self._users))
+            user_bytes = [seen.nbytes() for seen in self._users.values()]
+            metrics.set_gauge("seen_index.bytes", sum(user_bytes))
+            metrics.set_gauge("seen_index.max_user_bytes", max(user_bytes, default=0))
+
+    def mark_seen(self, user: str, resource_id: str):
+        """Record that a user completed a resource, without waiting for the next sync."""
+        with self._lock:
+            self._add(user, self._ordinal(resource_id))
+
+    def ordinals(self, resource_ids: Iterable[str]) -> np.ndarray:
+        with self._lock:
+            return np.fromiter((self._ordinal(resource_id) for resource_id in resource_ids), dtype=np.uint32)
+
+    def unseen_mask(self, user: str, ordinals: np.ndarray) -> np.ndarray:
+        """
+        Boolean mask over `ordinals` that is True where the user has not seen the resource.
+        """
+        with self._lock:
+            seen = self._users.get(user)
+            if seen is None:
+                return np.ones(len(ordinals), dtype=bool)
+            return ~seen.contains(ordinals)
+
+
+seen_index = SeenIndex()
@@ -0,0 +1,262 @@
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import metrics
+
+ARTICLES = {"a", "an", "the"}
+MAX_CANDIDATES = 20
+
+
+def normalize_topic(topic: str) -> str:
+    """
+    Reduce a topic to its canonical ID: casefolded, accents, punctuation and
+    articles stripped, word order kept, so "The Basics of Python!" and
+    "basics of python" share an ID while "Java to Kotlin" and "Kotlin to
+    Java" don't. Topics with no letters or digits at all fall back to their
+    trimmed, lowercased text.
+    """
+    text = "".join(c for c in unicodedata.normalize("NFKD", topic) if not unicodedata.combining(c)).casefold()
+    words = [word.strip("_") for word in re.findall(r"[\w+#]+", text) if word.strip("_")]
+    content_words = [word for word in words if word not in ARTICLES] or words
+    return " ".join(content_words) or topic.strip().lower()
+
+
+def trigrams(normalized: str) -> set:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Damerau-Levenshtein distance (adjacent transpositions count once), or `limit + 1` once it is exceeded."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] != b[j - 1]),
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+def is_misspelling(topic_id: str, known_id: str) -> bool:
+    """
+    Whether `topic_id` reads as a typo of `known_id`: the same words, except
+    that words of five or more letters may be one edit apart as long as their
+    first two letters agree. That accepts "pyhton" for "python" but not
+    "macroeconomics" for "microeconomics", "inorganic" for "organic" or
+    "calculus ii" for "calculus i".
+    """
+    words, known_words = topic_id.split(), known_id.split()
+    if len(words) != len(known_words):
+        return False
+    return all(
+        word == known or (
+            min(len(word), len(known)) >= 5
+            and word[:2] == known[:2]
+            and edit_distance(word, known, 1) <= 1
+        )
+        for word, known in zip(words, known_words)
+    )
+
+
+class TopicCanonicalizer:
+    """
+    Maps free-text topics onto canonical topic IDs.
+
+    A topic's ID is its normalized key, so every worker derives the same ID
+    from the same text. A topic whose key is unknown is mapped onto a stored
+    topic's ID only if it reads as a misspelling of it (`is_misspelling`).
+    Other close matches (Dice similarity over character trigrams of at least
+    `threshold`), such as "Macroeconomics" and "Microeconomics", stay apart
+    and are recorded as merge suggestions for review.
+
+    Only topics that have been stored are indexed, up to `max_topics`, with
+    an inverted index from character trigrams to compact arrays of topic
+    ordinals. Recent lookups of unknown topics are cached so a repeated
+    misspelling doesn't rescan the index.
+    """
+
+    def __init__(
+        self,
+        threshold: float = settings.TOPIC_MATCH_THRESHOLD,
+        candidate_threshold: float = settings.TOPIC_CANDIDATE_THRESHOLD,
+        max_topics: int = settings.TOPIC_INDEX_MAX_ENTRIES,
+        max_suggestions: int = settings.TOPIC_MAX_SUGGESTIONS,
+        max_lookups: int = settings.TOPIC_LOOKUP_CACHE_ENTRIES,
+        load_retry_seconds: float = settings.TOPIC_LOAD_RETRY_SECONDS,
+    ):
+        self.threshold = threshold
+        self.candidate_threshold = candidate_threshold
+        self.max_topics = max_topics
+        self.max_suggestions = max_suggestions
+        self.max_lookups = max_lookups
+        self.load_retry_seconds = load_retry_seconds
+        self.loaded = False
+        self._loading = False
+        self._last_load_attempt = None
+        self._ids: List[str] = []
+        self._gram_counts = array("H")
+        self._by_id: Dict[str, int] = {}
+        self._postings: Dict[str, array] = {}
+        self._suggestions: "OrderedDict[str, str]" = OrderedDict()
+        self._lookups: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, loader: Callable[[], Optional[Iterable[str]]]) -> bool:
+        """
+        Index the stored topics.
+
+        :param loader: Function returning stored topic IDs, or None on failure
+        :return: Whether the topics were loaded
+        """
+        topic_ids = loader()
+        if topic_ids is None:
+            return False
+        for topic_id in topic_ids:
+            self.register(topic_id)
+        self.loaded = True
+        print(f"Loaded {len(self._ids)} canonical topics")
+        return True
+
+    def load_in_background(self, loader: Callable[[], Optional[Iterable[str]]]):
+        """
+        Start `load` on a background thread unless the topics are loaded, a
+        load is running, or the last one failed less than `load_retry_seconds` ago.
+        """
+        with self._lock:
+            recently_tried = (
+                self._last_load_attempt is not None
+                and time.monotonic() - self._last_load_attempt < self.load_retry_seconds
+            )
+            if self.loaded or self._loading or recently_tried:
+                return
+            self._loading = True
+            self._last_load_attempt = time.monotonic()
+
+        def run():
+            try:
+                self.load(loader)
+            except Exception as e:
+                print(f"Failed to load canonical topics: {e}")
+            finally:
+                self._loading = False
+
+        threading.Thread(target=run, name="topic-loader", daemon=True).start()
+
+    def register(self, topic_id: str):
+        """Index a topic ID once a document has been stored under it."""
+        with self._lock:
+            if topic_id in self._by_id:
+                return
+            if len(self._ids) >= self.max_topics:
+                metrics.incr("topics.index_full")
+                return
+            ordinal = len(self._ids)
+            grams = trigrams(topic_id)
+            self._ids.append(topic_id)
+            self._gram_counts.append(min(len(grams), 0xFFFF))
+            self._by_id[topic_id] = ordinal
+            for gram in grams:
+                self._postings.setdefault(gram, array("I")).append(ordinal)
+            # A new topic can change what unknown topics map to
+            self._lookups.clear()
+            metrics.set_gauge("topics.canonical", len(self._ids))
+            metrics.set_gauge("topics.trigrams", len(self._postings))
+
+    def _similar(self, topic_id: str) -> Tuple[Optional[int], Optional[int]]:
+        """Return the ordinals of the closest topic `topic_id` misspells and of the closest other look-alike."""
+        grams = trigrams(topic_id)
+        shared = Counter()
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings is not None:
+                shared.update(postings)
+        scored = (
+            (2 * count / (len(grams) + self._gram_counts[ordinal]), ordinal)
+            for ordinal, count in shared.items()
+        )
+        look_alike = None
+        # A single typo in a short word breaks most of its trigrams, so misspellings are checked
+        # among weaker candidates than look-alikes need
+        for score, ordinal in sorted(scored, reverse=True)[:MAX_CANDIDATES]:
+            if score < self.candidate_threshold:
+                break
+            if self._ids[ordinal] == topic_id:
+                continue
+            if is_misspelling(topic_id, self._ids[ordinal]):
+                return ordinal, look_alike
+            if look_alike is None and score >= self.threshold:
+                look_alike = ordinal
+        return None, look_alike
+
+    def _suggest(self, topic_id: str, similar_id: str):
+        self._suggestions[topic_id] = similar_id
+        self._suggestions.move_to_end(topic_id)
+        while len(self._suggestions) > self.max_suggestions:
+            self._suggestions.popitem(last=False)
+
+    def canonicalize(self, topic: str) -> str:
+        """
+        Return the canonical ID for `topic`: its normalized key, or a stored
+        topic's ID if the key reads as a misspelling of it.
+        """
+        topic_id = normalize_topic(topic)
+        with self._lock:
+            if topic_id in self._by_id:
+                outcome, canonical = "known", topic_id
+            elif topic_id in self._lookups:
+                self._lookups.move_to_end(topic_id)
+                outcome, canonical = "cached", self._lookups[topic_id]
+            else:
+                misspelt, look_alike = self._similar(topic_id)
+                canonical = self._ids[misspelt] if misspelt is not None else topic_id
+                if misspelt is not None:
+                    outcome = "corrected"
+                elif look_alike is not None:
+                    outcome = "suggested"
+                    self._suggest(topic_id, self._ids[look_alike])
+                else:
+                    outcome = "new"
+                self._lookups[topic_id] = canonical
+                while len(self._lookups) > self.max_lookups:
+                    self._lookups.popitem(last=False)
+        metrics.incr("topics.canonicalized", outcome=outcome)
+        if outcome == "corrected":
+            print(f"Mapped topic '{topic}' onto '{canonical}'")
+        elif outcome == "suggested":
+            print(f"Topic '{topic_id}' looks like '{self._suggestions.get(topic_id)}'; not merged")
+        return canonical
+
+    def review(self, topic_id: str) -> Tuple[Optional[str], Optional[str]]:
+        """
+        For a stored topic, the other stored topic it reads as a misspelling
+        of, and the closest other look-alike, for reviewing merges by hand.
+        """
+        with self._lock:
+            misspelt, look_alike = self._similar(topic_id)
+            return (
+                self._ids[misspelt] if misspelt is not None else None,
+                self._ids[look_alike] if look_alike is not None else None,
+            )
+
+    def suggestions(self) -> Dict[str, str]:
+        """The most recent topic IDs that were kept apart from a look-alike, mapped to it."""
+        with self._lock:
+            return dict(self._suggestions)
+
+
+topic_canonicalizer = TopicCanonicalizer()
@@ -0,0 +1,70 @@
+"""
+Compare tail latency of direct upstream calls against hedged calls through
+app.core.resilience, using a fake upstream with a heavy-tailed latency
+distribution (mostly fast, with occasional Pareto-distributed stalls).
+
+Run from the repository root:
+
+    python -m benchmarks.hedging
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.metrics import metrics, percentile
+from app.core.resilience import Resilience
+
+
+def fake_upstream(rng: random.Random, stall_probability: float):
+    latency = rng.lognormvariate(-3.0, 0.3)  # median ~50ms
+    if rng.random() < stall_probability:
+        latency += min(3.0, 0.3 * rng.paretovariate(1.2))
+    time.sleep(latency)
+    return latency
+
+
+def run(label: str, call, requests: int, concurrency: int):
+    def timed(_):
+        started = time.monotonic()
+        call()
+        return (time.monotonic() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(requests)))
+    print(
+        f"{label:<8} p50={percentile(latencies, 50):7.1f}ms "
+        f"p95={percentile(latencies, 95):7.1f}ms "
+        f"p99={percentile(latencies, 99):7.1f}ms "
+        f"max={max(latencies):7.1f}ms"
+    )
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stall-probability", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    upstream = lambda: fake_upstream(rng, args.stall_probability)
+    resilience = Resilience(hedge_initial_delay_ms=150, hedge_min_delay_ms=20, max_workers=args.concurrency * 2)
+
+    # Warm up the latency history so the hedge delay comes from the observed p95
+    for _ in range(50):
+        resilience.call("fake", upstream, hedge=False)
+
+    direct = run("direct", upstream, args.requests, args.concurrency)
+    hedged = run("hedged", lambda: resilience.call("fake", upstream), args.requests, args.concurrency)
+
+    hedges = metrics.snapshot()["counters"].get("resilience.hedges{upstream=fake}", 0)
+    print(f"hedge delay {resilience.hedge_delay('fake') * 1000:.1f}ms, {int(hedges)} hedges sent "
+          f"({hedges / args.requests:.1%} extra load)")
+    print(f"p99 improvement: {percentile(direct, 99) / percentile(hedged, 99):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,25 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.endpoints import router
+from app.api.fauna_utils import load_canonical_topics
+from app.agents.model_router import model_router
+from app.core.config import settings
+from app.core.idempotency import IdempotencyConflict, IdempotencyInProgress
+from app.core.metrics import metrics
+from app.core.resilience import deadline, resilience, UpstreamUnavailable
+from app.core.topics import topic_canonicalizer
 
 
-app = FastAPI(title="AI tutor API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Full-collection scans on a background thread, so a slow or unreachable Fauna doesn't block startup
+    load_canonical_topics()
+    yield
+
+
+app = FastAPI(title="AI tutor API", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Adjust this to your needs
@@ -13,6 +29,32 @@ app.add_middleware(
 )
 app.include_router(router, prefix=f"/topics")
 
+@app.middleware("http")
+async def request_deadline(request: Request, call_next):
+    # Clients can ask for a shorter budget than the default with X-Request-Timeout (seconds)
+    seconds = settings.REQUEST_DEADLINE_SECONDS
+    try:
+        seconds = min(seconds, float(request.headers.get("X-Request-Timeout", seconds)))
+    except ValueError:
+        pass
+    with deadline(seconds):
+        return await call_next(request)
+
+@app.exception_handler(UpstreamUnavailable)
+@app.exception_handler(IdempotencyConflict)
+@app.exception_handler(IdempotencyInProgress)
+async def status_error_handler(request: Request, exc: Exception):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)})
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        **metrics.snapshot(),
+        "model_router": model_router.snapshot(),
+        "upstreams": resilience.snapshot(),
+        "topic_merge_suggestions": topic_canonicalizer.suggestions(),
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
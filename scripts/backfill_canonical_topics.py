@@ -0,0 +1,27 @@
+"""
+Give stored topic and mastery documents a canonical topic ID (the topic text
+is kept for display), merging per-user mastery documents whose topics share
+an ID. Topics that read as misspellings of, or only look like, another
+stored topic are printed for review and never merged.
+
+Run it once after scripts/create_fauna_indexes.py and before sending traffic
+to a build that looks topics up by ID, since documents written before then
+have no ID:
+
+    python -m scripts.backfill_canonical_topics --dry-run
+    python -m scripts.backfill_canonical_topics
+"""
+import argparse
+
+from app.api.fauna_utils import backfill_canonical_topics
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would change")
+    args = parser.parse_args()
+    backfill_canonical_topics(dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""
+Create the Fauna collections and indexes the API needs beyond the original
+schema. Existing ones are left alone, so it is safe to run on every deploy.
+
+Run from the repository root:
+
+    python -m scripts.create_fauna_indexes
+"""
+from faunadb import query as q
+
+from app.core.idempotency import IDEMPOTENCY_COLLECTION, IDEMPOTENCY_INDEX
+from app.db.fauna_client import fauna_client
+
+COLLECTIONS = [IDEMPOTENCY_COLLECTION]
+
+INDEXES = [
+    {
+        "name": "user_topics_by_user_and_topic_id",
+        "source": q.collection("mastery"),
+        "terms": [{"field": ["data", "userId"]}, {"field": ["data", "topicId"]}],
+    },
+    {
+        "name": "user_topic_mastery_by_user_and_topic_id",
+        "source": q.collection("user_topic_mastery"),
+        "terms": [{"field": ["data", "user"]}, {"field": ["data", "topic_id"]}],
+    },
+    {
+        "name": "user_topic_mastery_versions_by_user",
+        "source": q.collection("user_topic_mastery"),
+        "terms": [{"field": ["data", "user"]}],
+        "values": [{"field": ["ts"]}, {"field": ["ref"]}],
+    },
+    {
+        "name": IDEMPOTENCY_INDEX,
+        "source": q.collection(IDEMPOTENCY_COLLECTION),
+        "terms": [{"field": ["data", "key"]}],
+        "unique": True,
+    },
+]
+
+
+def main():
+    for name in COLLECTIONS:
+        fauna_client.query(q.if_(q.exists(q.collection(name)), None, q.create_collection({"name": name})))
+        print(f"Collection {name} ready")
+    for index in INDEXES:
+        fauna_client.query(q.if_(q.exists(q.index(index["name"])), None, q.create_index(index)))
+        print(f"Index {index['name']} ready")
+
+
+if __name__ == "__main__":
+    main()
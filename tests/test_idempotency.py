@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+
+from app.core.idempotency import IdempotencyConflict, IdempotencyStore
+
+
+class MemoryRecords:
+    """Stands in for the shared Fauna records."""
+
+    def __init__(self):
+        self.records = {}
+
+    def claim(self, key, request_fingerprint):
+        if key in self.records:
+            return dict(self.records[key])
+        self.records[key] = {"fingerprint": request_fingerprint, "state": "in_flight"}
+        return None
+
+    def get(self, key):
+        record = self.records.get(key)
+        return dict(record) if record is not None else None
+
+    def complete(self, key, response):
+        self.records[key].update(state="completed", response=response)
+
+    def release(self, key):
+        self.records.pop(key, None)
+
+
+class BrokenRecords(MemoryRecords):
+    def claim(self, key, request_fingerprint):
+        raise ConnectionError("storage unreachable")
+
+
+def counting_handler(calls, response="done", delay=0):
+    async def handler():
+        calls.append(None)
+        await asyncio.sleep(delay)
+        return response
+    return handler
+
+
+def test_retry_on_the_same_worker_replays():
+    async def scenario():
+        store, calls = IdempotencyStore(records=MemoryRecords()), []
+        first = await store.run("/x", "k", "fp", counting_handler(calls))
+        second = await store.run("/x", "k", "fp", counting_handler(calls))
+        return first, second, len(calls)
+
+    assert asyncio.run(scenario()) == (("done", False), ("done", True), 1)
+
+
+def test_retry_on_another_worker_replays_without_rerunning():
+    async def scenario():
+        records, calls = MemoryRecords(), []
+        worker_a = IdempotencyStore(records=records)
+        worker_b = IdempotencyStore(records=records)
+        await worker_a.run("/x", "k", "fp", counting_handler(calls, {"id": "r1"}))
+        replay = await worker_b.run("/x", "k", "fp", counting_handler(calls))
+        return replay, len(calls)
+
+    assert asyncio.run(scenario()) == (({"id": "r1"}, True), 1)
+
+
+def test_concurrent_retry_on_another_worker_waits_for_the_original():
+    async def scenario():
+        records, calls = MemoryRecords(), []
+        worker_a = IdempotencyStore(records=records, poll_interval_seconds=0.01)
+        worker_b = IdempotencyStore(records=records, poll_interval_seconds=0.01)
+        original = asyncio.ensure_future(worker_a.run("/x", "k", "fp", counting_handler(calls, "done", delay=0.05)))
+        await asyncio.sleep(0.01)
+        retry = await worker_b.run("/x", "k", "fp", counting_handler(calls))
+        return await original, retry, len(calls)
+
+    assert asyncio.run(scenario()) == (("done", False), ("done", True), 1)
+
+
+def test_failed_run_releases_the_key():
+    async def scenario():
+        records, calls = MemoryRecords(), []
+        store = IdempotencyStore(records=records)
+
+        async def fail():
+            raise RuntimeError("upstream error")
+
+        with pytest.raises(RuntimeError):
+            await store.run("/x", "k", "fp", fail)
+        return await store.run("/x", "k", "fp", counting_handler(calls)), len(calls)
+
+    assert asyncio.run(scenario()) == (("done", False), 1)
+
+
+def test_key_reused_for_a_different_request_is_rejected():
+    async def scenario():
+        records = MemoryRecords()
+        await IdempotencyStore(records=records).run("/x", "k", "fp", counting_handler([]))
+        await IdempotencyStore(records=records).run("/x", "k", "other", counting_handler([]))
+
+    with pytest.raises(IdempotencyConflict):
+        asyncio.run(scenario())
+
+
+def test_unreachable_records_fall_back_to_this_worker():
+    async def scenario():
+        store, calls = IdempotencyStore(records=BrokenRecords()), []
+        await store.run("/x", "k", "fp", counting_handler(calls))
+        return await store.run("/x", "k", "fp", counting_handler(calls)), len(calls)
+
+    assert asyncio.run(scenario()) == (("done", True), 1)
@@ -0,0 +1,37 @@
+from app.agents.model_router import ModelRouter
+
+
+def make_router():
+    router = ModelRouter()
+    router.probe_rate = 0
+    return router
+
+
+def test_unhealthy_model_recovers_through_probes():
+    router = make_router()
+    for _ in range(5):
+        router._stats("answer_feedback", "gpt-3.5-turbo").record(100, ok=False)
+    assert router.choose_model("answer_feedback", 10)[0] == "gpt-4"
+
+    router.probe_rate = 1
+    model, reason = router.choose_model("answer_feedback", 10)
+    assert (model, reason) == ("gpt-3.5-turbo", "probe")
+    for _ in range(50):
+        router._stats("answer_feedback", "gpt-3.5-turbo").record(100, ok=True)
+    router.probe_rate = 0
+    assert router.choose_model("answer_feedback", 10) == ("gpt-3.5-turbo", "short input")
+
+
+def test_stats_are_kept_per_task():
+    router = make_router()
+    for _ in range(5):
+        router._stats("summary", "gpt-3.5-turbo").record(100, ok=False)
+    assert router.choose_model("answer_feedback", 10)[0] == "gpt-3.5-turbo"
+
+
+def test_fallback_skips_models_that_only_fail():
+    router = make_router()
+    for _ in range(10):
+        router._stats("answer_feedback", "gpt-3.5-turbo").record(1, ok=False)
+        router._stats("answer_feedback", "gpt-4").record(12000, ok=True)
+    assert router.choose_model("answer_feedback", 10) == ("gpt-4", "all over SLO")
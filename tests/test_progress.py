@@ -0,0 +1,38 @@
+from app.core.progress import ProgressReportCache, compute_etag, etag_matches
+
+
+def test_etag_changes_with_any_document_version():
+    etag = compute_etag([("1", 10), ("2", 20)])
+    assert etag == compute_etag([("2", 20), ("1", 10)])
+    assert etag != compute_etag([("1", 10), ("2", 21)])
+    assert etag != compute_etag([("1", 10)])
+
+
+def test_etag_matches_lists_weak_and_wildcard():
+    etag = compute_etag([("1", 10)])
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_cached_report_is_only_served_for_the_current_etag():
+    cache = ProgressReportCache()
+    cache.put("ann", cache.generation("ann"), '"v1"', "report v1")
+    assert cache.get("ann", '"v1"') == "report v1"
+    assert cache.get("ann", '"v2"') is None
+    assert cache.get("ann", '"v1"') is None
+
+
+def test_report_built_across_an_invalidation_is_not_stored():
+    cache = ProgressReportCache()
+    generation = cache.generation("ann")
+    cache.invalidate("ann")
+    cache.put("ann", generation, '"v1"', "stale report")
+    assert cache.get("ann", '"v1"') is None
+
+
+def test_expired_report_is_dropped():
+    cache = ProgressReportCache(ttl_seconds=0)
+    cache.put("ann", cache.generation("ann"), '"v1"', "report")
+    assert cache.get("ann", '"v1"') is None
@@ -0,0 +1,45 @@
+from app.core.recommendations import RecommendationStore
+
+RESOURCE = {"id": "r1", "url": "https://example.com", "title": "Intro"}
+SUBTOPICS = [{"subtopic": "loops", "level": "beginner"}]
+
+
+def state(mastery_version=1, catalog_version=(3, "r3"), viewers=()):
+    return lambda resource_id: {
+        "mastery_version": mastery_version,
+        "catalog_version": catalog_version,
+        "viewers": list(viewers) if viewers is not None else None,
+    }
+
+
+def stored():
+    store = RecommendationStore()
+    store.put("ann", "python", SUBTOPICS, RESOURCE, 1, (3, "r3"))
+    return store
+
+
+def test_hit_when_shared_state_is_unchanged():
+    assert stored().get("ann", "python", SUBTOPICS, state()) == RESOURCE
+
+
+def test_misses_when_shared_state_moved_on():
+    assert stored().get("ann", "python", SUBTOPICS, state(mastery_version=2)) is None
+    assert stored().get("ann", "python", SUBTOPICS, state(catalog_version=(3, "r4"))) is None
+    assert stored().get("ann", "python", SUBTOPICS, state(viewers=["ann"])) is None
+    assert stored().get("ann", "python", SUBTOPICS, state(viewers=None)) is None
+    assert stored().get("ann", "python", SUBTOPICS, lambda resource_id: None) is None
+
+
+def test_state_is_only_read_for_a_candidate_entry():
+    def fail(resource_id):
+        raise AssertionError("state read without an entry")
+
+    store = stored()
+    assert store.get("bob", "python", SUBTOPICS, fail) is None
+    assert store.get("ann", "python", [], fail) is None
+
+
+def test_miss_drops_the_entry():
+    store = stored()
+    assert store.get("ann", "python", SUBTOPICS, state(viewers=["ann"])) is None
+    assert store.get("ann", "python", SUBTOPICS, state()) is None
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+
+from app.core.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    Resilience,
+    deadline,
+)
+
+
+def make_resilience(**kwargs):
+    options = {"failure_threshold": 2, "reset_seconds": 0.05, "hedge_initial_delay_ms": 50, "max_workers": 4}
+    options.update(kwargs)
+    return Resilience(**options)
+
+
+def fail():
+    raise RuntimeError("upstream error")
+
+
+def open_breaker(resilience, upstream="upstream"):
+    for _ in range(resilience.failure_threshold):
+        with pytest.raises(RuntimeError):
+            resilience.call(upstream, fail, hedge=False)
+
+
+def test_breaker_opens_then_half_open_probe_closes_it():
+    resilience = make_resilience()
+    open_breaker(resilience)
+    with pytest.raises(CircuitOpenError):
+        resilience.call("upstream", lambda: "ok")
+
+    time.sleep(0.06)
+    assert resilience.call("upstream", lambda: "ok") == "ok"
+    assert resilience.breaker("upstream").state == CircuitBreaker.CLOSED
+
+
+def test_is_open_agrees_with_allow_in_half_open():
+    breaker = CircuitBreaker("upstream", failure_threshold=1, reset_seconds=0, half_open_probes=1)
+    breaker.record_failure()
+    assert not breaker.is_open()
+    assert breaker.allow()
+    assert breaker.is_open()
+    assert not breaker.allow()
+    breaker.release()
+    assert not breaker.is_open()
+
+
+def test_expired_deadline_does_not_leak_probe_slot():
+    resilience = make_resilience()
+    open_breaker(resilience)
+    time.sleep(0.06)
+    with deadline(0):
+        with pytest.raises(DeadlineExceeded):
+            resilience.call("upstream", lambda: "ok")
+    assert resilience.call("upstream", lambda: "ok") == "ok"
+
+
+def test_short_client_deadline_does_not_open_breaker():
+    resilience = make_resilience(failure_threshold=1)
+    for _ in range(3):
+        with deadline(0.01):
+            with pytest.raises(DeadlineExceeded):
+                resilience.call("upstream", lambda: time.sleep(0.1) or "late", hedge=False)
+    assert resilience.breaker("upstream").state == CircuitBreaker.CLOSED
+    assert resilience.call("upstream", lambda: "ok") == "ok"
+
+
+def test_upstream_slower_than_its_usual_latency_counts_as_failure():
+    resilience = make_resilience(failure_threshold=1, hedge_initial_delay_ms=10)
+    with deadline(0.05):
+        with pytest.raises(DeadlineExceeded):
+            resilience.call("upstream", lambda: time.sleep(0.2), hedge=False)
+    assert resilience.breaker("upstream").state == CircuitBreaker.OPEN
+
+
+def test_client_errors_do_not_count_against_breaker():
+    resilience = make_resilience(failure_threshold=1)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            resilience.call("upstream", lambda: int("x"), client_errors=(ValueError,))
+    assert resilience.breaker("upstream").state == CircuitBreaker.CLOSED
+
+
+def test_hedge_answers_when_first_attempt_is_slow():
+    resilience = make_resilience(hedge_initial_delay_ms=20, hedge_min_delay_ms=0)
+    calls = []
+
+    def slow_then_fast():
+        calls.append(None)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    assert resilience.call("upstream", slow_then_fast) == "fast"
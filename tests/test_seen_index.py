@@ -0,0 +1,47 @@
+import random
+
+import numpy as np
+
+from app.core.metrics import metrics
+from app.core.seen_index import SeenIndex, SeenSet
+
+
+def test_seen_set_matches_a_plain_set_across_bitset_switch():
+    catalog_size = 1000
+    seen, expected = SeenSet(), set()
+    rng = random.Random(7)
+    for _ in range(200):
+        ordinal = rng.randrange(catalog_size)
+        seen.add(ordinal, catalog_size)
+        expected.add(ordinal)
+    assert seen._bits is not None
+    assert seen.nbytes() <= catalog_size // 8 + 1
+
+    ordinals = np.arange(catalog_size + 10, dtype=np.uint32)
+    assert seen.contains(ordinals).tolist() == [ordinal in expected for ordinal in ordinals]
+
+
+def test_sync_only_replays_new_viewers_and_masks_seen_resources():
+    index = SeenIndex()
+    resources = [
+        {"id": "a", "users": ["ann"]},
+        {"id": "b", "users": []},
+        {"id": "c", "users": ["bob", "ann"]},
+    ]
+    index.sync(resources)
+    ordinals = index.ordinals(resource["id"] for resource in resources)
+    assert index.unseen_mask("ann", ordinals).tolist() == [False, True, False]
+    assert index.unseen_mask("bob", ordinals).tolist() == [True, True, False]
+    assert index.unseen_mask("carol", ordinals).tolist() == [True, True, True]
+
+    resources[1]["users"].append("bob")
+    index.sync(resources)
+    assert index.unseen_mask("bob", ordinals).tolist() == [True, False, False]
+    assert metrics.snapshot()["gauges"]["seen_index.bytes"] > 0
+
+
+def test_mark_seen_applies_before_the_next_sync():
+    index = SeenIndex()
+    index.sync([{"id": "a", "users": []}])
+    index.mark_seen("ann", "a")
+    assert not index.unseen_mask("ann", index.ordinals(["a"]))[0]
@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from app.core.topics import TopicCanonicalizer, edit_distance, is_misspelling, normalize_topic
+
+
+def test_normalize_keeps_word_order_and_non_ascii_letters():
+    assert normalize_topic(" The Basics of Python! ") == "basics of python"
+    assert normalize_topic("Java to Kotlin") != normalize_topic("Kotlin to Java")
+    assert normalize_topic("Physique Élémentaire") == "physique elementaire"
+    assert normalize_topic("Физика") == normalize_topic("физика")
+    assert normalize_topic("C++") == "c++"
+    assert normalize_topic("???") == "???"
+
+
+def test_edit_distance_counts_transpositions_once():
+    assert edit_distance("python", "pyhton", 1) == 1
+    assert edit_distance("organic", "inorganic", 1) == 2
+
+
+@pytest.mark.parametrize("topic, known", [
+    ("pyhton", "python"),
+    ("calculas", "calculus"),
+    ("linear algebar", "linear algebra"),
+])
+def test_misspellings_are_recognised(topic, known):
+    assert is_misspelling(topic, known)
+
+
+@pytest.mark.parametrize("topic, known", [
+    ("macroeconomics", "microeconomics"),
+    ("inorganic chemistry", "organic chemistry"),
+    ("nonlinear regression", "linear regression"),
+    ("calculus ii", "calculus i"),
+    ("java", "lava"),
+])
+def test_different_subjects_are_not_misspellings(topic, known):
+    assert not is_misspelling(topic, known)
+
+
+def make_canonicalizer(*topic_ids, **kwargs):
+    canonicalizer = TopicCanonicalizer(**kwargs)
+    assert canonicalizer.load(lambda: list(topic_ids))
+    return canonicalizer
+
+
+def test_misspelling_maps_onto_stored_topic():
+    canonicalizer = make_canonicalizer("python", "microeconomics")
+    assert canonicalizer.canonicalize("Pyhton") == "python"
+    assert canonicalizer.canonicalize("Macroeconomics") == "macroeconomics"
+    assert canonicalizer.suggestions() == {"macroeconomics": "microeconomics"}
+
+
+def test_unstored_topics_are_not_indexed_and_suggestions_are_capped():
+    canonicalizer = make_canonicalizer("microeconomics", max_suggestions=2)
+    for prefix in ("macro", "mecro", "mucro"):
+        canonicalizer.canonicalize(f"{prefix}economics")
+    assert len(canonicalizer._ids) == 1
+    assert list(canonicalizer.suggestions()) == ["mecroeconomics", "mucroeconomics"]
+
+
+def test_index_is_bounded():
+    canonicalizer = make_canonicalizer("a", "b", "c", max_topics=2)
+    assert canonicalizer._ids == ["a", "b"]
+
+
+def test_failed_background_load_is_retried():
+    canonicalizer = TopicCanonicalizer(load_retry_seconds=0)
+    attempts = []
+
+    def loader():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise ConnectionError("storage unreachable")
+        return ["python"]
+
+    for _ in range(50):
+        canonicalizer.load_in_background(loader)
+        if canonicalizer.loaded:
+            break
+        time.sleep(0.01)
+    assert canonicalizer.loaded and len(attempts) == 2